@@ -1,36 +1,21 @@
-import importlib.util
+import itertools
 import os
+import weakref
 
 import numpy as np
 
-# Add the DLL directory
-os.add_dll_directory("C:\\Program Files\\Lumerical\\v232\\api\\python")
+from scattering_structure.fdtd_spec import SpecBuilder
+from scattering_structure.fdtd_sweep import run_fdtd_sweep
+from scattering_structure.lumapi_backend import get_lumapi
+from scattering_structure.lumerical import ObjectArray
 
-# Define the module name and file path
-module_name = "lumapi"
-# file_path = "C:\\Program Files\\Lumerical\\v232\\api\\python\\lumapi.py"
-file_path = "C:\\Program Files\\Lumerical\\v232\\api\\python\\lumapi.py"
 
-
-def load_module_from_file(module_name, file_path):
-    spec = importlib.util.spec_from_file_location(module_name, file_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
-
-
-# Load the module
-lumapi = load_module_from_file(module_name, file_path)
-
-
-def build_FDTD(lumerical_name: str, injection_angle=0):
+def simulation_spec(injection_angle=0):
+    # the device as a spec (see scattering_structure/fdtd_spec.py): the stack in y, the fiber tilted by the
+    # injection angle, the 2D solver, the input port and the monitors. The crystal is added by build_crystal
     ## Constants
-    wavelength_start = 1.5  # [um]
-    wavelength_stop = 1.6  # [um]
     block_length = 210  # [um]
     block_width = 210  # [um]
-    wg_mesh_step = 0.005
-
 
     AIR = {
         "length": block_length,
@@ -96,7 +81,6 @@ def build_FDTD(lumerical_name: str, injection_angle=0):
     }
 
     MOVIE = {
-        "name": "2D z normal",
         "monitor type": "2D z-normal",
         "x": 0,
         "x span": 100e-6,
@@ -108,7 +92,6 @@ def build_FDTD(lumerical_name: str, injection_angle=0):
     }
 
     MONITOR_1 = {
-        "name": "monitor_1",
         "monitor type": "Linear Y",
         "x": 35e-6,
         "y min": 8.3e-6,
@@ -117,7 +100,6 @@ def build_FDTD(lumerical_name: str, injection_angle=0):
     }
 
     MONITOR_2 = {
-        "name": "monitor_2",
         "monitor type": "Linear Y",
         "x": -35e-6,
         "y min": 8.3e-6,
@@ -125,196 +107,104 @@ def build_FDTD(lumerical_name: str, injection_angle=0):
         "z": 0
     }
 
+    spec = {}
     #########################################
     # SiO2, Si3N4, Air stack
     #########################################
-    fdtd = lumapi.FDTD()
-
-    # Si
-    fdtd.addrect()
-    fdtd.set('name', 'SUB')
-    coordinates = {
-        "x": 0,
-        "x span": SUB["length"] * 1e-6,
-        "y min": 0,
-        "y max": SUB["height"] * 1e-6,  # Height now represents the y span
-        "z": 0,  # Z-coordinate starts at 0
-        "z span": SUB["width"] * 1e-6  # Width now represents the z span
-    }
-    fdtd.set(coordinates)
-    fdtd.select('SUB')
-    fdtd.set('material', SUB["matname"])
-    # Default settings
-    fdtd.set('color opacity', 0.5)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 3)
-
-    # SiO2
-    fdtd.addrect()
-    fdtd.set('name', 'BOX')
-    coordinates = {
-        "x": 0,
-        "x span": BOX["length"] * 1e-6,
-        "y min": SUB["height"] * 1e-6,  # Start from Si height
-        "y max": SUB["height"] * 1e-6 + BOX["height"] * 1e-6,  # Height of SiO2
-        "z": 0,
-        "z span": BOX["width"] * 1e-6  # Width of SiO2
-    }
-    fdtd.set(coordinates)
-    fdtd.select('BOX')
-    fdtd.set('material', BOX["matname"])
-    # Default settings
-    fdtd.set('color opacity', 0.5)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 3)
-
-    # Si3N4
-    fdtd.addrect()
-    fdtd.set('name', 'WG')
-    coordinates = {
-        "x": 0,
-        "x span": WG["length"] * 1e-6,
-        "y min": (SUB["height"] + BOX["height"]) * 1e-6,  # Start from SiO2 height
-        "y max": (WG["height"] + SUB["height"] + BOX["height"]) * 1e-6,  # Height of Si3N4
-        "z": 0,
-        "z span": WG["width"] * 1e-6  # Width of Si3N4
-    }
-    fdtd.set(coordinates)
-    fdtd.select('WG')
-    fdtd.set('material', WG["matname"])
-    # Default settings
-    fdtd.set('color opacity', 0.5)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 3)
-
-    # Air
-    fdtd.addrect()
-    fdtd.set('name', 'AIR')
-    coordinates = {
-        "x": 0,
-        "x span": WG["length"] * 1e-6,
-        "y min": (WG["height"] + SUB["height"] + BOX["height"]) * 1e-6,
-        "y max": (WG["height"] + SUB["height"] + BOX["height"] + AIR["height"]) * 1e-6,
-        "z": 0,
-        "z span": WG["width"] * 1e-6  # Width of Si3N4
-    }
-    fdtd.set(coordinates)
-    fdtd.select('AIR')
-    fdtd.set('material', AIR["matname"])
-    # Default settings
-    fdtd.set('color opacity', 0.5)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 3)
+    # the height of a layer is its y span, its width the z span
+    y_min = 0
+    for name, layer in (("SUB", SUB), ("BOX", BOX), ("WG", WG), ("AIR", AIR)):
+        spec[name] = {"type": "rect",
+                      "properties": {"x": 0,
+                                     "x span": layer["length"] * 1e-6,
+                                     "y min": y_min * 1e-6,
+                                     "y max": (y_min + layer["height"]) * 1e-6,
+                                     "z": 0,
+                                     "z span": layer["width"] * 1e-6,
+                                     "material": layer["matname"],
+                                     # default settings
+                                     "color opacity": 0.5,
+                                     "override mesh order from material database": 1,
+                                     "mesh order": 3}}
+        y_min += layer["height"]
 
     #########################################
     # Add fiber
     #########################################
-    # Add fiber core
-    fdtd.addcircle()
-    fdtd.set('name', 'CORE')
     x_offset = np.sin(np.deg2rad(injection_angle)) * FDTD["y max"]
-    coordinates = {
-        "x": 0 + x_offset,
-        "y": 0,
-        "z": 0,
-        "z span": FIBER["z span"] * 1e-6,
-        "radius": FIBER["CORE"]["radius"] * 1e-6,
-        "first axis": "x",
-        "rotation 1": 90,
-        "second axis": "z",
-        "rotation 2": injection_angle
-    }
-    fdtd.set(coordinates)
-    fdtd.select('CORE')
-    fdtd.set('material', FIBER["CORE"]["matname"])
-    fdtd.set('color opacity', 0.3)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 4)
-    fdtd.addtogroup('FIBER')
-
-    # Add fiber cladding
-    fdtd.addcircle()
-    fdtd.set('name', 'CLADDING')
-    coordinates = {
-        "x": 0 + x_offset,
-        "y": 0,
-        "z": 0,
-        "z span": FIBER["z span"] * 1e-6,
-        "radius": FIBER["CLADDING"]["radius"] * 1e-6,
-        "first axis": "x",
-        "rotation 1": 90,
-        "second axis": "z",
-        "rotation 2": injection_angle
-    }
-    fdtd.set(coordinates)
-    fdtd.select('CLADDING')
-    fdtd.set('index', FIBER["CLADDING"]["index"])
-    fdtd.set('color opacity', 0.3)
-    fdtd.set('override mesh order from material database', 1)
-    fdtd.set('mesh order', 5)
-    fdtd.addtogroup('FIBER')
-
+    fiber = {"x": 0 + x_offset,
+             "y": 0,
+             "z": 0,
+             "z span": FIBER["z span"] * 1e-6,
+             "first axis": "x",
+             "rotation 1": 90,
+             "second axis": "z",
+             "rotation 2": injection_angle}
+    spec["FIBER::CORE"] = {"type": "circle",
+                           "properties": {**fiber,
+                                          "radius": FIBER["CORE"]["radius"] * 1e-6,
+                                          "material": FIBER["CORE"]["matname"],
+                                          "color opacity": 0.3,
+                                          "override mesh order from material database": 1,
+                                          "mesh order": 4}}
+    spec["FIBER::CLADDING"] = {"type": "circle",
+                               "properties": {**fiber,
+                                              "radius": FIBER["CLADDING"]["radius"] * 1e-6,
+                                              "index": FIBER["CLADDING"]["index"],
+                                              "color opacity": 0.3,
+                                              "override mesh order from material database": 1,
+                                              "mesh order": 5}}
 
     #########################################
     # Add solver
     #########################################
-
-    # and solver
-    fdtd.addfdtd()
-    for key, value in FDTD.items():
-        fdtd.setnamed("FDTD", key, value)
-    # add BCs
     # All PML
-
-    # change wavelength in solver manually
-    fdtd.setglobalsource("wavelength start", wavelength_start*1e-6)
-    fdtd.setglobalsource("wavelength stop", wavelength_stop*1e-6)
+    spec["FDTD"] = {"type": "fdtd", "properties": FDTD}
 
     #########################################
     # Add Ports
     #########################################
-
-    # Add port 1
-    fdtd.addport()
-    fdtd.set("name", "input_port")
-    for key, value in PORT1.items():
-        fdtd.set(key, value)
-
-    # select first order TE mode
-    # fdtd.select("FDTD::ports")
-    # fdtd.set("source port", "input_port")
-    #########################################
-    # Add mesh constraint
-    #########################################
+    spec["FDTD::ports::input_port"] = {"type": "port", "properties": PORT1}
 
     #########################################
     # Add monitors
     #########################################
+    spec["2D z normal"] = {"type": "movie", "properties": MOVIE}
+    spec["monitor_1"] = {"type": "power", "properties": MONITOR_1}
+    spec["monitor_2"] = {"type": "power", "properties": MONITOR_2}
+    return spec
 
-    # Add movie monitor
-    fdtd.addmovie()
-    for key, value in MOVIE.items():
-        fdtd.set(key, value)
 
-    # Add monitor 1
-    fdtd.addpower()
-    for key, value in MONITOR_1.items():
-        fdtd.set(key, value)
+def build_FDTD(lumerical_name: str, injection_angle=0, builder=None, backend=None):
+    # builds and saves the device without a crystal and returns the session. A builder (SpecBuilder) from an
+    # earlier call reuses its session, only the objects that differ from the last device are changed
+    wavelength_start = 1.5  # [um]
+    wavelength_stop = 1.6  # [um]
 
-    # Add monitor 2
-    fdtd.addpower()
-    for key, value in MONITOR_2.items():
-        fdtd.set(key, value)
+    if builder is None:
+        builder = SpecBuilder(get_lumapi(backend).FDTD())
+    builder.apply(simulation_spec(injection_angle))
+    # change wavelength in solver manually
+    builder.fdtd.setglobalsource("wavelength start", wavelength_start*1e-6)
+    builder.fdtd.setglobalsource("wavelength stop", wavelength_stop*1e-6)
+
+    # select first order TE mode
+    # fdtd.select("FDTD::ports")
+    # fdtd.set("source port", "input_port")
 
     #########################################
     # Save
     #########################################
-    fdtd.save(lumerical_name)
+    builder.fdtd.save(lumerical_name)
+
+    return builder.fdtd
 
-    return fdtd
 
+# the crystal of every session, kept between build_crystal calls so a sweep only rewrites what changed
+_crystals = weakref.WeakKeyDictionary()
 
-def build_crystal(fdtd, **kwargs):
+
+def build_crystal(fdtd, rebuild=False, **kwargs):
     dimension = kwargs["dimension"]
     crystal_constant = kwargs["crystal_constant"]
     scatterer_type = kwargs["scatterer"]
@@ -326,41 +216,73 @@ def build_crystal(fdtd, **kwargs):
         return np.r_[-x[::-1], 0, x]
 
     arr = np.array(mirrored(maxval=dimension/2, inc=crystal_constant))
-    point_tuples = np.array(np.meshgrid(arr, arr)).T.reshape(-1, 2)
+    # for now restrict to 2D, the row z = 0 of the square crystal
+    point_tuples = np.c_[arr, np.zeros_like(arr)]
 
     # Add scatterers in defined crystal order into given fdtd
 
     fdtd.select("WG")
     y_max = fdtd.get("y max")*1e6
-    # delete old crystal
-    fdtd.select("CRYSTAL")
-
-    fdtd.delete()
-
-    for point in point_tuples:
-        # for now restrict to 2D
-        if point[1] == 0:
-            coordinates = {
-                "x": point[0] * 1e-6,
-                "z": point[1] * 1e-6,
-                "y": (y_max - 0.5 * scatterer_kwargs["depth"]) * 1e-6,
-                "z span": scatterer_kwargs["depth"] * 1e-6,
-                "first axis": "x",
-                "rotation 1": 90}
-            if scatterer_type == "CIRCLE":
-                fdtd.addcircle()
-                fdtd.set("name", "circle")
-                coordinates["radius"] = scatterer_kwargs["radius"]*1e-6
-            elif scatterer_type == "RING":
-                fdtd.addring()
-                fdtd.set("name", "ring")
-                coordinates["inner radius"] = scatterer_kwargs["inner_radius"]*1e-6
-                coordinates["outer radius"] = scatterer_kwargs["outer_radius"]*1e-6
-            else:
-                raise ValueError("Invalid scatterer type")
-            fdtd.set(coordinates)
-            fdtd.set("material", scatterer_kwargs["matname"])
-            fdtd.set("color opacity", 0.5)
-            fdtd.set("override mesh order from material database", 1)
-            fdtd.set("mesh order", 1)
-            fdtd.addtogroup("CRYSTAL")
+
+    if scatterer_type == "CIRCLE":
+        kind = "circle"
+        properties = {"radius": scatterer_kwargs["radius"]*1e-6}
+    elif scatterer_type == "RING":
+        kind = "ring"
+        properties = {"inner radius": scatterer_kwargs["inner_radius"]*1e-6,
+                      "outer radius": scatterer_kwargs["outer_radius"]*1e-6}
+    else:
+        raise ValueError("Invalid scatterer type")
+    properties.update({
+        "y": (y_max - 0.5 * scatterer_kwargs["depth"]) * 1e-6,
+        "z span": scatterer_kwargs["depth"] * 1e-6,
+        "first axis": "x",
+        "rotation 1": 90,
+        "material": scatterer_kwargs["matname"],
+        "color opacity": 0.5,
+        "override mesh order from material database": 1,
+        "mesh order": 1})
+
+    # the existing scatterers are moved and resized in place, scatterers are only added or deleted when their
+    # number changes. rebuild deletes the old crystal first (needed if the session was changed by hand)
+    crystal = _crystals.get(fdtd)
+    if rebuild or crystal is None or crystal.kind != kind:
+        # delete old crystal
+        fdtd.select("CRYSTAL")
+        fdtd.delete()
+        crystal = _crystals[fdtd] = ObjectArray(fdtd, kind, ("x", "z"), "CRYSTAL")
+    crystal.update(point_tuples * 1e-6, properties)
+
+
+def build_sweep_point(fdtd, pitch, mode, ff=0.6, dimension=70):
+    # one point of the pitch x mode sweep of 1_a_crystal_for_each_mode.ipynb: input mode and crystal
+    fdtd.select("FDTD::ports::input_port")
+    fdtd.set("mode selection", "user select")
+    fdtd.set("selected mode numbers", mode)
+    CIRCLE = {
+        "radius": ((1-ff)*pitch)/2,  # [um]
+        "depth": 0.33,  # [um]
+        "matname": "etch"
+    }
+    build_crystal(fdtd, dimension=dimension, crystal_constant=pitch, scatterer="CIRCLE", scatterer_kwargs=CIRCLE)
+
+
+def sweep_transmission(fdtd, **point):
+    return float(max(fdtd.transmission("monitor_1")) + max(fdtd.transmission("monitor_2")))
+
+
+def sweep_crystal(base_file, pitches, modes, directory, ff=0.6, dimension=70, n_sessions=1, use_jobs=False,
+                  backend=None):
+    # the pitch x mode sweep in parallel: every session starts from the device in base_file (see build_FDTD),
+    # one .fsp per point in directory. Yields the transmission of each point as it finishes, see
+    # scattering_structure/fdtd_sweep.py
+    points = [{"pitch": float(pitch), "mode": int(mode)} for mode, pitch in itertools.product(modes, pitches)]
+    return run_fdtd_sweep(points,
+                          build=lambda fdtd, **point: build_sweep_point(fdtd, ff=ff, dimension=dimension, **point),
+                          analyse=sweep_transmission,
+                          directory=directory,
+                          setup=lambda fdtd: fdtd.load(os.path.abspath(base_file)),
+                          name="crystal",
+                          n_sessions=n_sessions,
+                          use_jobs=use_jobs,
+                          backend=backend)
@@ -0,0 +1,109 @@
+# lumapi calls and simulated IPC time of the FDTD builders against the recording lumapi stand-in, as a
+# function of the number of scatterers. The batched builds and the sweep steps have to stay at a constant
+# number of calls, with --check the benchmark fails when they do not (e.g. in CI)
+# run from the repository root: python -m benchmarks.bench_lumerical_build [--check]
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from scattering_structure.fdtd_spec import SpecBuilder
+from scattering_structure.lumapi_backend import RecordingFDTD
+
+SIZES = [100, 1000, 10_000, 100_000]  # number of scatterers
+MAX_UNBATCHED = 10_000  # the ring by ring build is only measured up to this size
+LATENCY = 1e-3  # s per lumapi call
+BANDWIDTH = 1e9  # bytes/s for putv and getv
+BUILDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'FDTD', 'builds')
+PITCH = 0.9  # crystal constant in um
+
+
+def load_build(name):
+    # build_FDTD.py of a build directory, which imports its own helpers from the directory
+    directory = os.path.join(BUILDS, name)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f'build_{name}', os.path.join(directory, 'build_FDTD.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def measure(setup, step):
+    # calls, simulated IPC time and python time of step(setup(fdtd)), setup is not counted
+    fdtd = RecordingFDTD(latency=LATENCY, bandwidth=BANDWIDTH)
+    state = setup(fdtd)
+    calls, simulated = len(fdtd.calls), fdtd.simulated_time
+    start = time.perf_counter()
+    step(state)
+    return len(fdtd.calls) - calls, fdtd.simulated_time - simulated, time.perf_counter() - start
+
+
+def device_builds(density, points):
+    # (setup, step) of the density sweep device: a new build and a sweep step to moved rings and a new angle
+    spec = density.simulation_spec(points)
+    moved = density.simulation_spec(points + 0.1, injection_angle=5)
+    builds = {'device, batched': (lambda fdtd: SpecBuilder(fdtd), lambda builder: builder.apply(spec)),
+              'device sweep step': (lambda fdtd: SpecBuilder(fdtd).apply(spec),
+                                    lambda builder: builder.apply(moved))}
+    if len(points) <= MAX_UNBATCHED:
+        builds['device, ring by ring'] = (lambda fdtd: SpecBuilder(fdtd, batched=False),
+                                          lambda builder: builder.apply(spec))
+    return builds
+
+
+def crystal_builds(crystal, size):
+    # (setup, step) of a crystal of about size scatterers: a new crystal and a pitch sweep step
+    def crystal_args(pitch):
+        return {'dimension': size * PITCH, 'crystal_constant': pitch, 'scatterer': 'CIRCLE',
+                'scatterer_kwargs': {'radius': 0.2 * pitch, 'depth': 0.33, 'matname': 'etch'}}
+
+    def waveguide(fdtd):
+        fdtd.addrect()
+        fdtd.set({'name': 'WG', 'y max': 8.63e-6})
+        return fdtd
+
+    def first(fdtd):
+        crystal.build_crystal(waveguide(fdtd), **crystal_args(PITCH))
+        return fdtd
+
+    return {'crystal': (waveguide, lambda fdtd: crystal.build_crystal(fdtd, **crystal_args(PITCH))),
+            'crystal pitch step': (first, lambda fdtd: crystal.build_crystal(fdtd, **crystal_args(1.01 * PITCH)))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check', action='store_true',
+                        help='fail if the calls of a batched build or a sweep step grow with the size')
+    args = parser.parse_args(argv)
+
+    density = load_build('single_gaussian_density_sweep')
+    crystal = load_build('multimode_fiber_photonic_crystal_2D')
+    rng = np.random.default_rng(0)
+    rows = []
+    calls = {}
+    for size in SIZES:
+        points = rng.uniform(-100, 100, size=(size, 2))
+        builds = {**device_builds(density, points), **crystal_builds(crystal, size)}
+        for name, (setup, step) in builds.items():
+            n, simulated, python = measure(setup, step)
+            calls.setdefault(name, []).append(n)
+            rows.append([size, name, n, f'{simulated:.3f}', f'{python:.3f}'])
+    print(tabulate(rows, headers=['scatterers', 'build', 'lumapi calls', f'IPC at {LATENCY * 1e3:g} ms/call [s]',
+                                  'python [s]']))
+
+    if args.check:
+        growing = [name for name, counts in calls.items()
+                   if 'ring by ring' not in name and max(counts) > min(counts)]
+        if growing:
+            sys.exit(f'the lumapi calls grow with the number of scatterers for: {", ".join(growing)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# compares the external poisson_disc package with the built-in Bridson sampler
+# run from the repository root: python -m benchmarks.bench_poisson_disc
+import time
+
+from tabulate import tabulate
+
+from scattering_structure.poisson_sampling import poisson_disc_sampling
+
+SIZES = [50, 100, 200]  # box side length in um, the circle fills the box
+RADIUS = 5 * 1.343  # poisson radius in um
+
+
+def run(radius, size, backend, domain):
+    start = time.perf_counter()
+    points = poisson_disc_sampling(radius, dims=(size, size), seed=0, backend=backend, domain=domain)
+    return time.perf_counter() - start, len(points)
+
+
+def main():
+    rows = []
+    for size in SIZES:
+        circle = {'type': 'circle', 'lx': size, 'ly': size, 'circle_radius': 0.5 * size}
+        t_ext, n_ext = run(RADIUS, size, 'poisson_disc', None)
+        t_box, n_box = run(RADIUS, size, 'builtin', None)
+        t_circle, n_circle = run(RADIUS, size, 'builtin', circle)
+        rows.append([size, n_ext, f'{t_ext:.3f}', n_box, f'{t_box:.3f}', n_circle, f'{t_circle:.3f}',
+                     f'{t_ext / t_circle:.1f}x'])
+    print(tabulate(rows, headers=['size [um]', 'N poisson_disc', 't [s]', 'N builtin box', 't [s]',
+                                  'N builtin circle', 't [s]', 'speed-up']))
+
+
+if __name__ == '__main__':
+    main()
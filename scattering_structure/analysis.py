@@ -0,0 +1,212 @@
+import numpy as np
+
+from .cell_list import iter_neighbours, iter_pairs
+from .geometry import center
+
+# Point statistics with edge correction. The observation window is a geometry dict of type 'box'
+# ({'type': 'box', 'lx': ..., 'ly': ...}) or 'circle' ({'type': 'circle', 'circle_radius': ...}) and the
+# points are relative to its center. Functions accept a ScatteringStructure instead of points, the window
+# is then taken from its geometry.
+
+
+def structure_window(structure):
+    # points and observation window of a ScatteringStructure. Circles are analysed on the reduced points,
+    # all other devices on the generated pattern in the box, which has the same statistics
+    geometry = structure.geometry
+    if geometry['type'] == 'load_from_file':
+        return _loaded_window(structure)
+    if geometry['type'] == 'circle':
+        return np.asarray(structure.reduced_points), {'type': 'circle',
+                                                      'circle_radius': geometry['circle_radius']}
+    points = np.asarray(structure.points)
+    # the rectangular pattern is generated around (0, 0), all others in the box
+    if structure.arrangement['type'] != 'rectangular':
+        points = points - center(geometry)
+    return points, {'type': 'box', 'lx': geometry['lx'], 'ly': geometry['ly']}
+
+
+def _loaded_window(structure):
+    # a loaded device file only has the reduced points. The window is the device they were saved from, as
+    # given by the metadata of .npy and .npz files, for boxes and circles and the bounding box of the
+    # points otherwise (e.g. .txt files)
+    points = np.asarray(structure.reduced_points, dtype=float).reshape(-1, 2)
+    metadata = structure.metadata or {}
+    geometry = metadata.get('geometry', structure.geometry)
+    arrangement = metadata.get('arrangement', structure.arrangement)
+    if geometry['type'] == 'circle':
+        return points, {'type': 'circle', 'circle_radius': geometry['circle_radius']}
+    if geometry['type'] == 'box':
+        if arrangement['type'] != 'rectangular':
+            points = points - center(geometry)
+        return points, {'type': 'box', 'lx': geometry['lx'], 'ly': geometry['ly']}
+    return _points_and_window(points, None)
+
+
+def _points_and_window(points, window):
+    if hasattr(points, 'geometry'):
+        points, default = structure_window(points)
+        return points, default if window is None else window
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if window is None:
+        # bounding box of the points
+        low, high = points.min(axis=0), points.max(axis=0)
+        points = points - 0.5 * (low + high)
+        window = {'type': 'box', 'lx': high[0] - low[0], 'ly': high[1] - low[1]}
+    return points, window
+
+
+def window_area(window):
+    if window['type'] == 'box':
+        return window['lx'] * window['ly']
+    elif window['type'] == 'circle':
+        return np.pi * window['circle_radius'] ** 2
+    else:
+        raise TypeError(f'The window type {window["type"]} is not supported, use a box or a circle')
+
+
+def set_covariance(window, r):
+    # isotropized set covariance, the mean area of the window intersected with itself shifted by r
+    r = np.asarray(r, dtype=float)
+    if window['type'] == 'box':
+        a, b = window['lx'], window['ly']
+        return np.clip(a * b - 2 * r * (a + b) / np.pi + r ** 2 / np.pi, 0, None)
+    elif window['type'] == 'circle':
+        radius = window['circle_radius']
+        r = np.minimum(r, 2 * radius)
+        return 2 * radius ** 2 * np.arccos(r / (2 * radius)) - 0.5 * r * np.sqrt(4 * radius ** 2 - r ** 2)
+    else:
+        raise TypeError(f'The window type {window["type"]} is not supported, use a box or a circle')
+
+
+def border_distance(window, points):
+    # distance of every point to the edge of the window
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if window['type'] == 'box':
+        return np.minimum(0.5 * window['lx'] - np.abs(points[:, 0]), 0.5 * window['ly'] - np.abs(points[:, 1]))
+    elif window['type'] == 'circle':
+        return window['circle_radius'] - np.hypot(points[:, 0], points[:, 1])
+    else:
+        raise TypeError(f'The window type {window["type"]} is not supported, use a box or a circle')
+
+
+def radial_distribution(points, r_max, bins=100, window=None):
+    # pair correlation function g(r) up to r_max, edge corrected with the set covariance of the window.
+    # Returns the bin centers and g
+    points, window = _points_and_window(points, window)
+    edges = np.linspace(0, r_max, bins + 1) if np.isscalar(bins) else np.asarray(bins, dtype=float)
+    counts = np.zeros(len(edges) - 1)
+    for _, _, d in iter_pairs(points, edges[-1]):
+        counts += np.histogram(d, bins=edges)[0]
+
+    n = len(points)
+    r = 0.5 * (edges[1:] + edges[:-1])
+    if n < 2:
+        return r, np.zeros_like(r)
+    # every pair is counted once, g normalizes the ordered pairs by lambda^2 and the window overlap
+    shell = np.pi * (edges[1:] ** 2 - edges[:-1] ** 2) * set_covariance(window, r)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        g = 2 * counts * window_area(window) ** 2 / (n * (n - 1) * shell)
+    return r, g
+
+
+def nearest_neighbour_distances(points, window=None):
+    # distance of every point to its nearest neighbour in O(N k) via a cell list, inf for a single point
+    points, window = _points_and_window(points, window)
+    n = len(points)
+    d = np.full(n, np.inf)
+    if n < 2:
+        return d
+    # twice the mean spacing finds the neighbour of almost every point
+    cutoff = 2 * np.sqrt(window_area(window) / n)
+    for i, j, distance in iter_pairs(points, cutoff):
+        np.minimum.at(d, i, distance)
+        np.minimum.at(d, j, distance)
+    # the few isolated points are compared against all others
+    lonely = np.flatnonzero(np.isinf(d))
+    for start in range(0, len(lonely), max(1, 2 ** 22 // n)):
+        rows = lonely[start:start + max(1, 2 ** 22 // n)]
+        d2 = np.sum((points[rows, None, :] - points[None, :, :]) ** 2, axis=-1)
+        d2[np.arange(len(rows)), rows] = np.inf
+        d[rows] = np.sqrt(d2.min(axis=1))
+    return d
+
+
+def nearest_neighbour_histogram(points, bins=100, window=None, r_max=None):
+    # probability density of the nearest neighbour distance. Points closer to the edge than to their
+    # nearest neighbour are left out (border correction). Returns the bin centers and the density
+    points, window = _points_and_window(points, window)
+    d = nearest_neighbour_distances(points, window)
+    d = d[d <= border_distance(window, points)]
+    if r_max is None:
+        r_max = d.max() if len(d) else 1
+    density, edges = np.histogram(d, bins=bins, range=(0, r_max), density=True)
+    return 0.5 * (edges[1:] + edges[:-1]), density
+
+
+def coordination_numbers(points, cutoff, window=None):
+    # number of neighbours within cutoff of every point, nan for points closer than cutoff to the edge
+    points, window = _points_and_window(points, window)
+    counts = np.zeros(len(points))
+    for i, j, _ in iter_pairs(points, cutoff):
+        counts += np.bincount(i, minlength=len(points)) + np.bincount(j, minlength=len(points))
+    counts[border_distance(window, points) < cutoff] = np.nan
+    return counts
+
+
+def coordination_number(points, cutoff, window=None):
+    # mean number of neighbours within cutoff
+    return np.nanmean(coordination_numbers(points, cutoff, window))
+
+
+def window_centers(window, margin, n, rng=None):
+    # n uniformly distributed centers of sampling windows that lie at least margin inside the window
+    rng = np.random.default_rng(rng)
+    if window['type'] == 'box':
+        hx, hy = 0.5 * window['lx'] - margin, 0.5 * window['ly'] - margin
+        if hx < 0 or hy < 0:
+            raise ValueError(f'Sampling windows of radius {margin} do not fit into the box')
+        return rng.uniform((-hx, -hy), (hx, hy), size=(n, 2))
+    elif window['type'] == 'circle':
+        radius = window['circle_radius'] - margin
+        if radius < 0:
+            raise ValueError(f'Sampling windows of radius {margin} do not fit into the circle')
+        r = radius * np.sqrt(rng.uniform(size=n))
+        phi = rng.uniform(0, 2 * np.pi, size=n)
+        return np.column_stack([r * np.cos(phi), r * np.sin(phi)])
+    else:
+        raise TypeError(f'The window type {window["type"]} is not supported, use a box or a circle')
+
+
+def number_variance(points, radii, n_windows=2000, window=None, rng=None):
+    # mean and variance of the number of points inside circular sampling windows of the given radii.
+    # All radii share the same n_windows random centers, placed so that the largest window still lies
+    # inside the observation window, and the exact counts for all radii come from one neighbour search
+    points, window = _points_and_window(points, window)
+    radii = np.asarray(radii, dtype=float)
+    order = np.argsort(radii)
+    sorted_radii = radii[order]
+    centers = window_centers(window, sorted_radii[-1], n_windows, rng)
+
+    counts = np.zeros((n_windows, len(radii) + 1))
+    for q, _, d in iter_neighbours(points, centers, sorted_radii[-1]):
+        # a point at distance d lies inside all windows with a radius larger than d
+        k = np.searchsorted(sorted_radii, d, side='right')
+        counts += np.bincount(q * (len(radii) + 1) + k, minlength=counts.size).reshape(counts.shape)
+    counts = np.cumsum(counts, axis=1)[:, :-1]
+
+    mean = np.empty(len(radii))
+    variance = np.empty(len(radii))
+    mean[order] = counts.mean(axis=0)
+    variance[order] = counts.var(axis=0, ddof=1)
+    return mean, variance
+
+
+def hyperuniformity_exponent(radii, variance, r_min=None, r_max=None):
+    # exponent alpha of sigma^2(R) ~ R^alpha from a log-log fit. Poisson patterns give 2 (variance grows
+    # with the area), hyperuniform patterns less than 2 (1 for lattices and class I disorder)
+    radii = np.asarray(radii, dtype=float)
+    variance = np.asarray(variance, dtype=float)
+    used = (variance > 0) & (radii >= (r_min or 0)) & (radii <= (r_max or np.inf))
+    if used.sum() < 2:
+        raise ValueError('At least two radii with a finite number variance are needed for the fit')
+    return np.polyfit(np.log(radii[used]), np.log(variance[used]), 1)[0]
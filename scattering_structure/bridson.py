@@ -0,0 +1,63 @@
+import numpy as np
+
+from .geometry import geometry_bounds, geometry_mask
+from .random_sequential_addition import RandomSequentialAddition
+
+
+def bridson(radius, domain, rng=None, k=30, max_active=4096, fixed=None):
+    # Bridson's poisson disc sampling (https://www.cs.ubc.ca/~rbridson/docs/bridson-siggraph07-poissondisk.pdf)
+    # directly inside the domain, a geometry dict (see geometry.py), in box coordinates. Instead of one
+    # active point at a time, k candidates are drawn in the annulus [radius, 2 * radius] around up to
+    # max_active active points at once. The candidates are tested against the background grid and each
+    # other in one vectorized pass, an active point retires when none of its candidates is accepted. Fixed
+    # points (e.g. of a neighbouring tile, at most one radius outside the bounds of the domain) are
+    # respected and grown from, but not returned.
+    rng = np.random.default_rng() if rng is None else rng
+    bounds = geometry_bounds(domain)
+    grid = RandomSequentialAddition(bounds, exclusion_distance=radius, rng=rng)
+
+    n_fixed = 0 if fixed is None else len(fixed)
+    if n_fixed:
+        # all fixed points start out active
+        grid.add_points(fixed)
+        active = np.arange(n_fixed)
+    else:
+        # first point, uniformly inside the domain
+        low = np.array([bounds[0], bounds[2]])
+        high = np.array([bounds[1], bounds[3]])
+        while True:
+            start = rng.uniform(low, high, size=(64, 2))
+            start = start[geometry_mask(domain, start)]
+            if len(start):
+                break
+        grid.add_points(start[:1])
+        active = np.array([0])
+
+    while len(active):
+        if len(active) > max_active:
+            chosen = rng.choice(len(active), size=max_active, replace=False)
+        else:
+            chosen = np.arange(len(active))
+        centers = grid.get_points(active[chosen])
+
+        # k candidates per active point, uniform in the area of the annulus
+        r = radius * np.sqrt(rng.uniform(1, 4, size=(len(centers), k)))
+        phi = rng.uniform(0, 2 * np.pi, size=(len(centers), k))
+        candidates = np.stack([centers[:, 0, None] + r * np.cos(phi),
+                               centers[:, 1, None] + r * np.sin(phi)], axis=-1).reshape(-1, 2)
+        owner = np.repeat(np.arange(len(centers)), k)
+        inside = geometry_mask(domain, candidates)
+        candidates, owner = candidates[inside], owner[inside]
+
+        accepted, _ = grid.resolve(candidates)
+        n = grid.n
+        grid.add_points(candidates[accepted])
+
+        # active points without any accepted candidate retire, the new points become active
+        retired = np.ones(len(centers), dtype=bool)
+        retired[owner[accepted]] = False
+        keep = np.ones(len(active), dtype=bool)
+        keep[chosen[retired]] = False
+        active = np.concatenate([active[keep], np.arange(n, grid.n)])
+
+    return grid.get_points(np.arange(n_fixed, grid.n))
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# bump whenever a generator changes its output for the same parameters, this invalidates all cached entries
+GENERATOR_VERSION = 3
+
+# arrangement entries that do not change the generated points. n_jobs is part of the key, the predictive
+# optimizer evaluates n_jobs radii per step and ends on a different pattern for a different n_jobs
+_IGNORED_KEYS = ('tile_directory',)
+
+# arrangements that give the same points for the same parameters even without a seed
+_DETERMINISTIC = ('rectangular', 'tetrahedral', 'lattice')
+
+
+def jsonable(value):
+    # json.dumps default for the NumPy types that show up in geometry and arrangement dicts
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'{type(value)} cannot be used in a cache key')
+
+
+def cache_key(geometry: dict, arrangement: dict, scatterer_radius: float):
+    # stable hash of everything that determines the generated points
+    arrangement = {k: v for k, v in arrangement.items() if k not in _IGNORED_KEYS}
+    description = {'geometry': geometry,
+                   'arrangement': arrangement,
+                   'scatterer_radius': scatterer_radius,
+                   'seed': arrangement.get('seed'),
+                   'version': GENERATOR_VERSION}
+    text = json.dumps(description, sort_keys=True, default=jsonable)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def is_cacheable(arrangement: dict):
+    # random patterns are only reproducible, and therefore only cached, with a seed
+    if arrangement['type'] == 'load_from_file':
+        return False
+    return arrangement['type'] in _DETERMINISTIC or arrangement.get('seed') is not None
+
+
+def _is_npy_file(points):
+    # True for the memory-mapped array of a complete .npy file (np.load with mmap_mode), not a part of it
+    if not isinstance(points, np.memmap) or points.filename is None:
+        return False
+    try:
+        whole = np.load(points.filename, mmap_mode='r')
+    except (ValueError, OSError):
+        return False
+    return (whole.shape, whole.dtype, whole.offset, whole.strides) == (points.shape, points.dtype, points.offset,
+                                                                       points.strides)
+
+
+class DistributionCache:
+    # content-addressed on-disk store of generated points, one .npy file per key.
+    # the modification time of a file is its last use, the least recently used files are deleted
+    # as soon as the cache grows beyond max_bytes
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npy')
+
+    def get(self, key, mmap=False):
+        # mmap=True returns the points memory-mapped, e.g. for patterns that do not fit into memory
+        path = self._path(key)
+        try:
+            points = np.load(path, mmap_mode='r' if mmap else None)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        # mark as recently used
+        os.utime(path)
+        return points
+
+    def put(self, key, points):
+        path = self._path(key)
+        # write to a temporary file first, so concurrent readers never see a partial file
+        temporary = f'{path}.{os.getpid()}.tmp'
+        if _is_npy_file(points):
+            # a whole memory-mapped .npy file is copied file to file, without reading it into memory
+            shutil.copyfile(points.filename, temporary)
+        else:
+            with open(temporary, 'wb') as file:
+                np.save(file, np.ascontiguousarray(points))
+        os.replace(temporary, path)
+        self._evict()
+
+    def clear(self):
+        for entry in self._entries():
+            os.remove(entry.path)
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.npy')]
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
@@ -0,0 +1,105 @@
+import numpy as np
+
+# half of the 3x3 neighbourhood, so every pair of cells is only visited once
+_FORWARD_OFFSETS = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def iter_pairs(points, cutoff, max_pairs=2 ** 22):
+    # all pairs (i, j, distance) with i < j and distance < cutoff, found via a uniform cell list with
+    # cell size = cutoff. The pairs are yielded in chunks of at most max_pairs candidates, so dense
+    # neighbourhoods of large patterns never have to be held in memory at once
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(points)
+    if n < 2:
+        return
+
+    ij = np.floor((points - points.min(axis=0)) / cutoff).astype(np.int64)
+    # one spare column, so the x - 1 neighbour of the first column never wraps into the previous row
+    nx = ij[:, 0].max() + 2
+    keys = ij[:, 1] * nx + ij[:, 0]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    ordered = points[order]
+    position = np.arange(n)
+
+    for dx, dy in _FORWARD_OFFSETS:
+        target = sorted_keys + dy * nx + dx
+        lo = np.searchsorted(sorted_keys, target, side='left')
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        if dx == 0 and dy == 0:
+            # inside the own cell only look at the following entries
+            lo = np.maximum(lo, position + 1)
+        counts = np.maximum(hi - lo, 0)
+        ends = np.cumsum(counts)
+        if ends[-1] == 0:
+            continue
+        start = 0
+        while start < n:
+            # the following positions with at most max_pairs candidates, but at least one position
+            stop = max(int(np.searchsorted(ends, ends[start] - counts[start] + max_pairs, side='right')), start + 1)
+            c = counts[start:stop]
+            total = c.sum()
+            if total > 0:
+                a = np.repeat(position[start:stop], c)
+                b = np.repeat(lo[start:stop] - np.cumsum(c) + c, c) + np.arange(total)
+                # distances on the sorted copy, neighbouring cells are close in memory there
+                delta = ordered[a] - ordered[b]
+                d2 = delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+                close = d2 < cutoff ** 2
+                a, b = order[a[close]], order[b[close]]
+                yield np.minimum(a, b), np.maximum(a, b), np.sqrt(d2[close])
+            start = stop
+
+
+def pairs_within(points, cutoff):
+    # all pairs (i, j) with i < j and |p_i - p_j| < cutoff
+    first, second = [], []
+    for i, j, _ in iter_pairs(points, cutoff):
+        first.append(i)
+        second.append(j)
+    if not first:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def iter_neighbours(points, queries, cutoff, max_pairs=2 ** 22):
+    # all (query index, point index, distance) with distance < cutoff, yielded in chunks of at most
+    # max_pairs candidates. The three cells of a row are neighbours in the sorted keys, so every query
+    # only looks up three ranges
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    queries = np.asarray(queries, dtype=float).reshape(-1, 2)
+    if len(points) == 0 or len(queries) == 0:
+        return
+
+    origin = np.minimum(points.min(axis=0), queries.min(axis=0)) - cutoff
+    ij = np.floor((points - origin) / cutoff).astype(np.int64)
+    query_ij = np.floor((queries - origin) / cutoff).astype(np.int64)
+    # spare columns on both sides, so the x +- 1 neighbours never wrap into another row
+    nx = max(ij[:, 0].max(), query_ij[:, 0].max()) + 2
+    keys = ij[:, 1] * nx + ij[:, 0]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    ordered = points[order]
+    query_keys = query_ij[:, 1] * nx + query_ij[:, 0]
+    position = np.arange(len(queries))
+
+    for dy in (-1, 0, 1):
+        lo = np.searchsorted(sorted_keys, query_keys + dy * nx - 1, side='left')
+        hi = np.searchsorted(sorted_keys, query_keys + dy * nx + 1, side='right')
+        counts = hi - lo
+        ends = np.cumsum(counts)
+        if ends[-1] == 0:
+            continue
+        start = 0
+        while start < len(queries):
+            stop = max(int(np.searchsorted(ends, ends[start] - counts[start] + max_pairs, side='right')), start + 1)
+            c = counts[start:stop]
+            total = c.sum()
+            if total > 0:
+                q = np.repeat(position[start:stop], c)
+                b = np.repeat(lo[start:stop] - np.cumsum(c) + c, c) + np.arange(total)
+                delta = queries[q] - ordered[b]
+                d2 = delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+                close = d2 < cutoff ** 2
+                yield q[close], order[b[close]], np.sqrt(d2[close])
+            start = stop
@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+
+from .cache import jsonable
+
+# Distribution files:
+#   .txt  one "x\ty" line per point (the original format)
+#   .npy  (N, 2) float64 array, memory-mapped on load, metadata in a .json file next to it
+#   .npz  points and metadata in one (optionally compressed) file, read fully on load
+
+
+def _metadata_path(filepath):
+    return os.path.splitext(filepath)[0] + '.json'
+
+
+def save_distribution(filepath, points, metadata=None, compressed=False):
+    points = np.ascontiguousarray(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.npy':
+        np.save(filepath, points)
+        if metadata is not None:
+            with open(_metadata_path(filepath), 'w') as file:
+                json.dump(metadata, file, default=jsonable, indent=2)
+    elif extension == '.npz':
+        save = np.savez_compressed if compressed else np.savez
+        save(filepath, points=points, metadata=json.dumps(metadata, default=jsonable))
+    else:
+        # repr of a python float is exact, so the text format stays lossless
+        with open(filepath, 'w') as file:
+            file.write(''.join(f"{x}\t{y}\n" for x, y in points.tolist()))
+
+
+def load_distribution(filepath, mmap=True):
+    # returns the (N, 2) points and the metadata (None if there is none)
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.npy':
+        points = np.load(filepath, mmap_mode='r' if mmap else None)
+        metadata = None
+        if os.path.isfile(_metadata_path(filepath)):
+            with open(_metadata_path(filepath), 'r') as file:
+                metadata = json.load(file)
+        return points, metadata
+    elif extension == '.npz':
+        with np.load(filepath) as data:
+            return data['points'], json.loads(str(data['metadata']))
+    else:
+        # NumPy's C parser reads all lines at once instead of splitting them one by one in python
+        return np.loadtxt(filepath, delimiter='\t', dtype=np.float64, ndmin=2).reshape(-1, 2), None
+
+
+def write_manifest(filepath, results):
+    # (re)writes the json manifest of a sweep, the result dicts sorted by their 'index'. The new file replaces
+    # the old one at once, so an interrupted sweep always leaves a complete manifest of its finished points
+    temporary = f'{filepath}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(sorted(results, key=lambda result: result['index']), file, default=jsonable, indent=2)
+    os.replace(temporary, filepath)
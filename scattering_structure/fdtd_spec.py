@@ -0,0 +1,139 @@
+import numpy as np
+
+from .lumerical import add_rings, ring_properties, update_rings
+
+# A simulation spec is a dict from the full object name ('group::subgroup::name') to a description:
+#   {'type': 'rect', 'properties': {...}}    any lumapi add<type>(), e.g. rect, fdtd, gaussian, mesh, power,
+#                                             movie. The properties are set in the given order
+#   {'type': 'rings', 'points': ..., 'ring': RING, 'z': z}
+#                                             a group of rings at the (x, y) points in μm, see lumerical.py
+# SpecBuilder turns a spec into lumapi calls. Applied again to the same session it compares the new spec
+# with the last one and only adds, changes or deletes the objects that differ. An object whose spec drops
+# properties is deleted and added again, so they return to their defaults.
+
+# objects whose name is given by Lumerical
+_FIXED_NAMES = ('fdtd',)
+# objects Lumerical puts into a group of its own, e.g. 'FDTD::ports::input_port'
+_FIXED_GROUPS = {'port': 'FDTD::ports'}
+
+
+def _same(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    return np.array_equal(a, b)
+
+
+def _split(path):
+    group, _, name = path.rpartition('::')
+    return group, name
+
+
+class SpecBuilder:
+    def __init__(self, fdtd, batched=True):
+        self.fdtd = fdtd
+        self.batched = batched
+        # the spec the session reflects and the groups in it
+        self.applied = {}
+        self._groups = set()
+        # groups created during the current apply, they are still at the top level
+        self._new_groups = set()
+
+    def apply(self, spec):
+        # brings the session from the last applied spec to this one
+        kept = {}
+        for path, description in self.applied.items():
+            if path in spec and spec[path]['type'] == description['type']:
+                kept[path] = description
+            else:
+                self._delete(path)
+
+        for path, description in spec.items():
+            if path not in kept:
+                self._add(path, description)
+            elif description['type'] == 'rings':
+                self._update_rings(path, kept[path], description)
+            elif kept[path]['properties'].keys() - description['properties'].keys():
+                # Lumerical cannot unset a property, an object that lost some is rebuilt with the defaults,
+                # together with the objects Lumerical keeps in it (e.g. the ports of the solver)
+                self._delete(path)
+                self._add(path, description)
+                kept = {other: kept[other] for other in kept if not other.startswith(path + '::')}
+            else:
+                self._update(path, kept[path]['properties'], description['properties'])
+        self._nest_groups()
+
+        # a copy, so changes to the given spec show up as differences on the next apply
+        self.applied = {}
+        for path, description in spec.items():
+            if description['type'] == 'rings':
+                points = np.array(description['points'], dtype=float).reshape(-1, 2)
+                self.applied[path] = dict(description, points=points, ring=dict(description['ring']))
+            else:
+                self.applied[path] = dict(description, properties=dict(description['properties']))
+        return self
+
+    def _group_name(self, group):
+        return _split(group)[1] if group in self._new_groups else group
+
+    def _add_to_group(self, group):
+        # addtogroup creates a missing group around the selection at the top level
+        if group in self._groups:
+            self.fdtd.addtogroup(self._group_name(group))
+            return
+        self.fdtd.addtogroup(_split(group)[1])
+        self._groups.add(group)
+        self._new_groups.add(group)
+
+    def _nest_groups(self):
+        # moves the new nested groups into their parents, deepest first, like the build scripts do
+        while True:
+            nested = [group for group in self._new_groups if '::' in group]
+            if not nested:
+                break
+            group = max(nested, key=lambda group: group.count('::'))
+            self.fdtd.select(_split(group)[1])
+            self._new_groups.remove(group)
+            self._add_to_group(_split(group)[0])
+        self._new_groups = set()
+
+    def _add(self, path, description):
+        group, name = _split(path)
+        if description['type'] == 'rings':
+            # the rings are a group of their own, created at the top level
+            add_rings(self.fdtd, description['points'], ring=description['ring'], z=description['z'],
+                      group=name, batched=self.batched)
+            self._groups.add(path)
+            self._new_groups.add(path)
+            return
+
+        getattr(self.fdtd, 'add' + description['type'])()
+        if description['type'] not in _FIXED_NAMES:
+            self.fdtd.set('name', name)
+        if description['properties']:
+            self.fdtd.set(dict(description['properties']))
+        if group and group != _FIXED_GROUPS.get(description['type']):
+            self._add_to_group(group)
+
+    def _update(self, path, old, new):
+        changed = {key: value for key, value in new.items() if key not in old or not _same(old[key], value)}
+        if changed:
+            self.fdtd.select(path)
+            self.fdtd.set(changed)
+
+    def _update_rings(self, path, old, new):
+        points = np.asarray(new['points'], dtype=float).reshape(-1, 2)
+        if len(points) != len(old['points']):
+            self._delete(path)
+            self._add(path, new)
+            return
+        old_properties = ring_properties(old['ring'], old['z'])
+        changed = {key: value for key, value in ring_properties(new['ring'], new['z']).items()
+                   if not _same(old_properties[key], value)}
+        if changed or not _same(old['points'], points):
+            # same number of rings, rewritten in place by one script evaluation
+            update_rings(self.fdtd, points, group=path, properties=changed)
+
+    def _delete(self, path):
+        self.fdtd.select(path)
+        self.fdtd.delete()
+        self._groups = {group for group in self._groups if group != path and not group.startswith(path + '::')}
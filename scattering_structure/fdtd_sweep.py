@@ -0,0 +1,157 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .distribution_io import write_manifest
+from .lumapi_backend import get_lumapi
+
+
+def _close(fdtd):
+    try:
+        fdtd.close()
+    except Exception:
+        pass
+
+
+class _Sessions:
+    # up to n solver sessions shared by the worker threads, opened on first use. A session that failed is
+    # closed and replaced by a new one for the next point
+    def __init__(self, n, setup, backend):
+        self.setup = setup
+        self.backend = backend
+        self.idle = queue.Queue()
+        for _ in range(n):
+            self.idle.put(None)
+
+    def open(self):
+        fdtd = get_lumapi(self.backend).FDTD(hide=True)
+        if self.setup is not None:
+            self.setup(fdtd)
+        return fdtd
+
+    def run(self, task):
+        fdtd = self.idle.get()
+        try:
+            if fdtd is None:
+                fdtd = self.open()
+            result = task(fdtd)
+        except Exception:
+            if fdtd is not None:
+                _close(fdtd)
+            self.idle.put(None)
+            raise
+        self.idle.put(fdtd)
+        return result
+
+    def close(self):
+        while not self.idle.empty():
+            fdtd = self.idle.get()
+            if fdtd is not None:
+                _close(fdtd)
+
+
+def _run_sessions(jobs, build, analyse, sessions, n_sessions):
+    # every point built, saved, run and analysed in one of the sessions. Yields (job, result, error)
+    def task(job):
+        def run(fdtd):
+            index, point, filepath = job
+            fdtd.switchtolayout()
+            build(fdtd, **point)
+            fdtd.save(filepath)
+            fdtd.run()
+            return analyse(fdtd, **point)
+        return sessions.run(run)
+
+    with ThreadPoolExecutor(max_workers=n_sessions) as executor:
+        futures = {executor.submit(task, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error
+
+
+def _run_jobs(jobs, build, analyse, sessions, n_sessions):
+    # the points are built and saved in one session and run through its job queue (addjob/runjobs), at most
+    # n_sessions at a time. The results are read back by loading the files into the same session, which
+    # then gets the last built file again, so its layout matches the builder state. Yields (job, result, error)
+    for start in range(0, len(jobs), n_sessions):
+        batch = jobs[start:start + n_sessions]
+
+        def run(fdtd):
+            # a point that cannot be built fails alone, a failing runjobs fails the batch and the session
+            errors = {}
+            for index, point, filepath in batch:
+                try:
+                    fdtd.switchtolayout()
+                    build(fdtd, **point)
+                    fdtd.save(filepath)
+                    fdtd.addjob(filepath)
+                    last = filepath
+                except Exception as error:
+                    errors[index] = error
+            if len(errors) == len(batch):
+                return [(None, errors[index]) for index, point, filepath in batch]
+            fdtd.runjobs()
+            results = []
+            for index, point, filepath in batch:
+                if index in errors:
+                    results.append((None, errors[index]))
+                    continue
+                try:
+                    fdtd.load(filepath)
+                    results.append((analyse(fdtd, **point), None))
+                except Exception as error:
+                    results.append((None, error))
+            fdtd.load(last)
+            return results
+
+        try:
+            results = sessions.run(run)
+        except Exception as error:
+            results = [(None, error)] * len(batch)
+        for job, (result, error) in zip(batch, results):
+            yield job, result, error
+
+
+def run_fdtd_sweep(points, build, analyse, directory, setup=None, name='point', n_sessions=1, use_jobs=False,
+                   max_retries=2, backend=None):
+    # runs an FDTD simulation for every parameter point (a dict, e.g. from sweep.grid) and writes one .fsp per
+    # point. setup(fdtd) prepares every new session (e.g. loads a base file), build(fdtd, **point) changes the
+    # layout for the point and analyse(fdtd, **point) returns its result after the run.
+    # The points run in n_sessions concurrent solver sessions, or with use_jobs through the job queue of one
+    # session with at most n_sessions jobs at a time. Points that fail (including a crashed session, which is
+    # replaced) are retried up to max_retries times, only those points. Yields one result dict per point in
+    # completion order, failed points with their 'error', and updates the sweep.json manifest after each
+    # point, so an interrupted sweep keeps the results of the finished points. Like any generator it runs
+    # nothing until it is iterated
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(index, point, os.path.abspath(os.path.join(directory, f'{name}_{index:04d}.fsp')))
+            for index, point in enumerate(points)]
+    sessions = _Sessions(1 if use_jobs else n_sessions, setup, backend)
+    run = _run_jobs if use_jobs else _run_sessions
+
+    manifest = os.path.join(directory, 'sweep.json')
+    results = []
+    write_manifest(manifest, results)
+    try:
+        for attempt in range(max_retries + 1):
+            failed = []
+            for (index, point, filepath), result, error in run(jobs, build, analyse, sessions, n_sessions):
+                if error is not None and attempt < max_retries:
+                    failed.append((index, point, filepath))
+                    continue
+                results.append({'index': index,
+                                'point': point,
+                                'filepath': filepath,
+                                'result': result,
+                                'attempts': attempt + 1})
+                if error is not None:
+                    results[-1]['error'] = repr(error)
+                write_manifest(manifest, results)
+                yield results[-1]
+            if not failed:
+                break
+            jobs = sorted(failed, key=lambda job: job[0])
+    finally:
+        sessions.close()
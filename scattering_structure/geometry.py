@@ -0,0 +1,186 @@
+import numpy as np
+from matplotlib.path import Path
+
+# Geometries are dicts with the (lx x ly) box the patterns are generated in plus the shape of the device,
+# which sits in the middle of the box:
+#   {'type': 'box', 'lx': ..., 'ly': ...}
+#   {'type': 'circle', ..., 'circle_radius': ...}
+#   {'type': 'annulus', ..., 'circle_radius': ..., 'inner_radius': ...}
+#   {'type': 'sector', ..., 'circle_radius': ..., 'angle': ..., 'orientation': 0, 'inner_radius': 0}
+#   {'type': 'polygon', ..., 'vertices': [(x, y), ...], 'holes': [[(x, y), ...], ...]}
+# angles are in degrees, the orientation is the direction of the bisector of the sector and polygon
+# vertices are relative to the center of the box. 'pizza_slice' is an alias for 'sector'.
+
+SHAPES = ('box', 'circle', 'annulus', 'sector', 'pizza_slice', 'polygon')
+
+
+def center(geometry):
+    return 0.5 * geometry['lx'], 0.5 * geometry['ly']
+
+
+# ---------------------------------------
+# MASKS, relative to the center of the shape
+# ---------------------------------------
+
+def circle_mask(x, y, radius):
+    return x * x + y * y <= radius ** 2
+
+
+def annulus_mask(x, y, inner_radius, outer_radius):
+    r2 = x * x + y * y
+    return (r2 >= inner_radius ** 2) & (r2 <= outer_radius ** 2)
+
+
+def sector_mask(x, y, radius, angle, orientation=0, inner_radius=0):
+    # angle between the point and the bisector, wrapped to [-pi, pi)
+    phi = np.arctan2(y, x) - np.deg2rad(orientation)
+    phi = (phi + np.pi) % (2 * np.pi) - np.pi
+    return annulus_mask(x, y, inner_radius, radius) & (np.abs(phi) <= 0.5 * np.deg2rad(angle))
+
+
+def polygon_mask(x, y, vertices, holes=()):
+    # vectorized point in polygon test, shapely polygons are accepted as well
+    if hasattr(vertices, 'exterior'):
+        holes = [interior.coords for interior in vertices.interiors]
+        vertices = vertices.exterior.coords
+    xy = np.column_stack([x, y])
+    mask = Path(np.asarray(vertices, dtype=float)).contains_points(xy)
+    for hole in holes:
+        mask &= ~Path(np.asarray(hole, dtype=float)).contains_points(xy)
+    return mask
+
+
+def shape_mask(geometry, x, y):
+    # x, y relative to the center of the box
+    shape = geometry['type']
+    if shape == 'box':
+        return (np.abs(x) <= 0.5 * geometry['lx']) & (np.abs(y) <= 0.5 * geometry['ly'])
+    elif shape == 'circle':
+        return circle_mask(x, y, geometry['circle_radius'])
+    elif shape == 'annulus':
+        return annulus_mask(x, y, geometry['inner_radius'], geometry['circle_radius'])
+    elif shape in ('sector', 'pizza_slice'):
+        return sector_mask(x, y, geometry['circle_radius'], geometry['angle'], geometry.get('orientation', 0),
+                           geometry.get('inner_radius', 0))
+    elif shape == 'polygon':
+        return polygon_mask(x, y, geometry['vertices'], geometry.get('holes', ()))
+    else:
+        raise TypeError(f'The given geometry type {shape} is not supported')
+
+
+# ---------------------------------------
+# GEOMETRY IN BOX COORDINATES
+# ---------------------------------------
+
+def geometry_mask(geometry, points):
+    # which of the points (in box coordinates, origin in the corner of the box) lie inside the device
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    cx, cy = center(geometry)
+    return shape_mask(geometry, points[:, 0] - cx, points[:, 1] - cy)
+
+
+def geometry_bounds(geometry):
+    # (min_x, max_x, min_y, max_y) of the device in box coordinates
+    cx, cy = center(geometry)
+    if geometry['type'] == 'box':
+        return 0, geometry['lx'], 0, geometry['ly']
+    elif geometry['type'] == 'polygon':
+        vertices = geometry['vertices']
+        vertices = np.asarray(vertices.exterior.coords if hasattr(vertices, 'exterior') else vertices)
+        (min_x, min_y), (max_x, max_y) = vertices.min(axis=0), vertices.max(axis=0)
+        return cx + min_x, cx + max_x, cy + min_y, cy + max_y
+    elif geometry['type'] in SHAPES:
+        r = geometry['circle_radius']
+        return cx - r, cx + r, cy - r, cy + r
+    else:
+        raise TypeError(f'The given geometry type {geometry["type"]} is not supported')
+
+
+def geometry_area(geometry):
+    shape = geometry['type']
+    if shape == 'box':
+        return geometry['lx'] * geometry['ly']
+    elif shape == 'circle':
+        return np.pi * geometry['circle_radius'] ** 2
+    elif shape == 'annulus':
+        return np.pi * (geometry['circle_radius'] ** 2 - geometry['inner_radius'] ** 2)
+    elif shape in ('sector', 'pizza_slice'):
+        return 0.5 * np.deg2rad(geometry['angle']) * (geometry['circle_radius'] ** 2
+                                                      - geometry.get('inner_radius', 0) ** 2)
+    elif shape == 'polygon':
+        def shoelace(v):
+            v = np.asarray(v, dtype=float)
+            return 0.5 * abs(np.dot(v[:, 0], np.roll(v[:, 1], 1)) - np.dot(v[:, 1], np.roll(v[:, 0], 1)))
+        vertices, holes = geometry['vertices'], geometry.get('holes', ())
+        if hasattr(vertices, 'exterior'):
+            return vertices.area
+        return shoelace(vertices) - sum(shoelace(hole) for hole in holes)
+    else:
+        raise TypeError(f'The given geometry type {shape} is not supported')
+
+
+def geometry_outline(geometry, n=256):
+    # closed outline(s) of the device relative to its center for plotting, separate parts split by nan
+    def arc(radius, start, stop):
+        phi = np.linspace(start, stop, n)
+        return radius * np.cos(phi), radius * np.sin(phi)
+
+    def ring(vertices):
+        v = np.asarray(vertices, dtype=float)
+        return np.r_[v[:, 0], v[0, 0]], np.r_[v[:, 1], v[0, 1]]
+
+    shape = geometry['type']
+    if shape == 'box':
+        hx, hy = 0.5 * geometry['lx'], 0.5 * geometry['ly']
+        parts = [ring([(-hx, -hy), (hx, -hy), (hx, hy), (-hx, hy)])]
+    elif shape == 'circle':
+        parts = [arc(geometry['circle_radius'], 0, 2 * np.pi)]
+    elif shape == 'annulus':
+        parts = [arc(geometry['circle_radius'], 0, 2 * np.pi), arc(geometry['inner_radius'], 0, 2 * np.pi)]
+    elif shape in ('sector', 'pizza_slice'):
+        half = 0.5 * np.deg2rad(geometry['angle'])
+        orientation = np.deg2rad(geometry.get('orientation', 0))
+        outer_x, outer_y = arc(geometry['circle_radius'], orientation - half, orientation + half)
+        inner_x, inner_y = arc(geometry.get('inner_radius', 0), orientation + half, orientation - half)
+        parts = [(np.r_[outer_x, inner_x, outer_x[0]], np.r_[outer_y, inner_y, outer_y[0]])]
+    elif shape == 'polygon':
+        vertices, holes = geometry['vertices'], geometry.get('holes', ())
+        if hasattr(vertices, 'exterior'):
+            holes = [interior.coords for interior in vertices.interiors]
+            vertices = vertices.exterior.coords
+        parts = [ring(vertices)] + [ring(hole) for hole in holes]
+    else:
+        raise TypeError(f'The given geometry type {shape} is not supported')
+
+    x = np.concatenate([np.r_[px, np.nan] for px, _ in parts])[:-1]
+    y = np.concatenate([np.r_[py, np.nan] for _, py in parts])[:-1]
+    return x, y
+
+
+def reduce_points(geometry, points):
+    # the points inside the device, moved so that the center of the device is at (0, 0).
+    # boxes keep the points as they are and return them without a copy
+    if geometry['type'] == 'box':
+        return points
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    cx, cy = center(geometry)
+    centered = points - (cx, cy)
+    mask = shape_mask(geometry, centered[:, 0], centered[:, 1])
+    if mask.all():
+        return centered
+    return centered[mask]
+
+
+def reduce_points_to_file(geometry, points, filepath, chunk_size=2 ** 20):
+    # reduce_points for patterns that do not fit into memory, e.g. memory-mapped ones. The points are
+    # reduced chunk by chunk into the .npy file at filepath, which is returned memory-mapped
+    starts = range(0, len(points), chunk_size)
+    counts = [len(reduce_points(geometry, points[start:start + chunk_size])) for start in starts]
+    out = np.lib.format.open_memmap(filepath, mode='w+', dtype=np.float64, shape=(sum(counts), 2))
+    position = 0
+    for start, count in zip(starts, counts):
+        out[position:position + count] = reduce_points(geometry, points[start:start + chunk_size])
+        position += count
+    out.flush()
+    del out
+    return np.load(filepath, mmap_mode='r')
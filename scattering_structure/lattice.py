@@ -0,0 +1,51 @@
+import numpy as np
+
+# primitive vectors (in units of the lattice constant) and basis (in fractional coordinates of the
+# primitive vectors) of the supported 2D lattices, 'aspect' is the length of a2 relative to a1
+LATTICES = {
+    'square': lambda aspect: ((1, 0), (0, 1), ((0, 0),)),
+    'rectangular': lambda aspect: ((1, 0), (0, aspect), ((0, 0),)),
+    'hexagonal': lambda aspect: ((1, 0), (0.5, 0.5 * np.sqrt(3)), ((0, 0),)),
+    'triangular': lambda aspect: ((1, 0), (0.5, 0.5 * np.sqrt(3)), ((0, 0),)),
+    'centered_rectangular': lambda aspect: ((1, 0), (0, aspect), ((0, 0), (0.5, 0.5))),
+    'honeycomb': lambda aspect: ((1, 0), (0.5, 0.5 * np.sqrt(3)), ((0, 0), (1 / 3, 1 / 3))),
+}
+
+
+def bravais_lattice(a1, a2, bounds, basis=((0, 0),), rotation=0, offset=(0, 0)):
+    # all points offset + R(rotation) (n a1 + m a2 + b) inside bounds = (min_x, max_x, min_y, max_y),
+    # for all integers n, m and basis vectors b given in fractional coordinates of a1 and a2.
+    # rotation is in degrees.
+    phi = np.deg2rad(rotation)
+    rot = np.array([[np.cos(phi), -np.sin(phi)], [np.sin(phi), np.cos(phi)]])
+    vectors = np.array([a1, a2], dtype=float) @ rot.T  # rows are the rotated primitive vectors
+    basis = np.asarray(basis, dtype=float) @ vectors
+    offset = np.asarray(offset, dtype=float)
+
+    # range of lattice indices that covers the bounds, from the fractional coordinates of its corners
+    min_x, max_x, min_y, max_y = bounds
+    corners = np.array([[min_x, min_y], [max_x, min_y], [min_x, max_y], [max_x, max_y]]) - offset
+    fractional = np.linalg.solve(vectors.T, corners.T).T
+    reach = np.ceil(np.abs(np.linalg.solve(vectors.T, basis.T).T).max(initial=0))
+    n = np.arange(np.floor(fractional[:, 0].min()) - reach, np.ceil(fractional[:, 0].max()) + reach + 1)
+    m = np.arange(np.floor(fractional[:, 1].min()) - reach, np.ceil(fractional[:, 1].max()) + reach + 1)
+
+    points = (offset + n[:, None, None, None] * vectors[0] + m[None, :, None, None] * vectors[1]
+              + basis[None, None, :, :]).reshape(-1, 2)
+    inside = ((points[:, 0] >= min_x) & (points[:, 0] <= max_x)
+              & (points[:, 1] >= min_y) & (points[:, 1] <= max_y))
+    return points[inside]
+
+
+def lattice_vectors(arrangement: dict):
+    # primitive vectors and basis of a 'lattice' arrangement, either a named lattice with lattice
+    # constant 'dist' or explicit 'a1', 'a2' (and 'basis')
+    if 'a1' in arrangement:
+        return (np.asarray(arrangement['a1'], dtype=float), np.asarray(arrangement['a2'], dtype=float),
+                arrangement.get('basis', ((0, 0),)))
+    name = arrangement.get('lattice', 'square')
+    if name not in LATTICES:
+        raise TypeError(f'The given lattice {name} is not supported')
+    a1, a2, basis = LATTICES[name](arrangement.get('aspect', 1))
+    return (arrangement['dist'] * np.asarray(a1, dtype=float), arrangement['dist'] * np.asarray(a2, dtype=float),
+            basis)
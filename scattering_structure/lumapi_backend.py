@@ -0,0 +1,224 @@
+import collections
+import importlib.util
+import os
+import time
+import types
+import warnings
+
+import numpy as np
+
+# lumapi.py of the Lumerical installation, the LUMAPI_PATH environment variable overrides it
+DEFAULT_LUMAPI_PATH = "C:\\Program Files\\Lumerical\\v232\\api\\python\\lumapi.py"
+
+# names Lumerical gives to new objects, other objects are named by their type
+_DEFAULT_NAMES = {'rect': 'rectangle', 'fdtd': 'FDTD', 'gaussian': 'source', 'power': 'monitor'}
+# groups Lumerical puts new objects into, the others are added at the top level
+_DEFAULT_GROUPS = {'port': 'FDTD::ports'}
+# objects that hold other objects
+_CONTAINERS = ('group', 'fdtd')
+# add functions that do not create an object
+_NOT_OBJECTS = ('addjob',)
+
+_lumapi = None
+
+
+def load_lumapi(path=None):
+    # imports lumapi from the Lumerical installation on first use, raises ImportError without one
+    global _lumapi
+    if _lumapi is None:
+        path = path or os.environ.get('LUMAPI_PATH', DEFAULT_LUMAPI_PATH)
+        if not os.path.isfile(path):
+            raise ImportError(f'lumapi was not found at {path}')
+        # lumapi loads the Lumerical DLLs next to it on Windows
+        if hasattr(os, 'add_dll_directory'):
+            os.add_dll_directory(os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location('lumapi', path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except OSError as error:
+            raise ImportError(f'lumapi at {path} could not be loaded: {error}') from error
+        _lumapi = module
+    return _lumapi
+
+
+def get_lumapi(backend=None):
+    # 'lumerical' the real lumapi, 'recording' the in-process stand-in (see RecordingFDTD), 'auto' the real
+    # one where it loads and the stand-in with a warning otherwise. The LUMAPI_BACKEND environment variable
+    # sets the default, which is 'lumerical', so a missing installation raises instead of silently running
+    # against the stand-in. E.g. LUMAPI_BACKEND=recording to profile the builders without Lumerical
+    backend = backend or os.environ.get('LUMAPI_BACKEND', 'lumerical')
+    if backend == 'lumerical':
+        return load_lumapi()
+    elif backend == 'recording':
+        return recording
+    elif backend == 'auto':
+        try:
+            return load_lumapi()
+        except ImportError as error:
+            warnings.warn(f'{error}, the builds run against the recording stand-in and nothing is simulated',
+                          RuntimeWarning, stacklevel=2)
+            return recording
+    else:
+        raise TypeError(f'The given lumapi backend {backend} is not supported')
+
+
+class Call:
+    # one lumapi call of a RecordingFDTD, time in s since the session was opened
+    def __init__(self, name, args, kwargs, time):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.time = time
+
+    def __repr__(self):
+        return f'Call({self.name}, {self.args}, {self.kwargs}, {self.time:.6f})'
+
+
+class RecordingFDTD:
+    # in-process stand-in for lumapi.FDTD. Every call is recorded with its time. The layout is kept as a list
+    # of objects (type, name, group and properties) for add*, set, setnamed, get, getnamed, getnamednumber,
+    # select, delete and addtogroup, putv/getv keep the variables. Scripts passed to eval are recorded, not
+    # executed, and save, run and everything else are recorded without effect.
+    # simulated_time adds up the cost of the calls against a real session: latency per call (s) and the
+    # transferred bytes of putv/getv over bandwidth (bytes/s)
+    def __init__(self, latency=0.0, bandwidth=None, **kwargs):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.calls = []
+        # objects by id, in the order they were added, and their ids by full name
+        self._objects = {}
+        self._index = collections.defaultdict(dict)
+        self.selection = []
+        self.variables = {}
+        self.simulated_time = 0.0
+        self._start = time.perf_counter()
+
+    def _record(self, name, args, kwargs, nbytes=0):
+        self.calls.append(Call(name, args, kwargs, time.perf_counter() - self._start))
+        self.simulated_time += self.latency + (nbytes / self.bandwidth if self.bandwidth else 0)
+
+    def call_counts(self):
+        return collections.Counter(call.name for call in self.calls)
+
+    def __getattr__(self, name):
+        # any other lumapi function, add<type> creates an object
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._record(name, args, kwargs)
+            if name.startswith('add') and name not in _NOT_OBJECTS:
+                kind = name[3:]
+                obj = self._add(kind, _DEFAULT_NAMES.get(kind, kind), _DEFAULT_GROUPS.get(kind, ''))
+                self.selection = [obj]
+        return call
+
+    @property
+    def objects(self):
+        return list(self._objects.values())
+
+    @staticmethod
+    def path(obj):
+        return obj['group'] + '::' + obj['name'] if obj['group'] else obj['name']
+
+    def _add(self, kind, name, group=''):
+        obj = {'type': kind, 'name': name, 'group': group, 'properties': {}}
+        self._objects[id(obj)] = obj
+        self._index[self.path(obj)][id(obj)] = obj
+        return obj
+
+    def _find(self, name):
+        return list(self._index.get(name.removeprefix('::model::'), {}).values())
+
+    def _descendants(self, obj):
+        if obj['type'] not in _CONTAINERS:
+            return []
+        path = self.path(obj)
+        return [child for child in self._objects.values()
+                if child['group'] == path or child['group'].startswith(path + '::')]
+
+    def _set(self, objects, key, value=None):
+        properties = key if isinstance(key, dict) else {key: value}
+        for obj in objects:
+            for key, value in properties.items():
+                if key == 'name':
+                    self._move(obj, value, obj['group'])
+                else:
+                    obj['properties'][key] = value
+
+    def _move(self, obj, name, group):
+        # renames or regroups the object together with its children, if it is a group
+        old = self.path(obj)
+        moved = [obj] + self._descendants(obj)
+        for child in moved:
+            del self._index[self.path(child)][id(child)]
+        obj['name'], obj['group'] = name, group
+        for child in moved[1:]:
+            child['group'] = self.path(obj) + child['group'][len(old):]
+        for child in moved:
+            self._index[self.path(child)][id(child)] = child
+
+    def set(self, key, value=None):
+        self._record('set', (key,) if value is None else (key, value), {})
+        self._set(self.selection, key, value)
+
+    def setnamed(self, name, key, value=None):
+        self._record('setnamed', (name, key) if value is None else (name, key, value), {})
+        self._set(self._find(name), key, value)
+
+    def get(self, key):
+        self._record('get', (key,), {})
+        return self.selection[0]['properties'].get(key) if self.selection else None
+
+    def getnamed(self, name, key):
+        self._record('getnamed', (name, key), {})
+        objects = self._find(name)
+        return objects[0]['properties'].get(key) if objects else None
+
+    def getnamednumber(self, name):
+        self._record('getnamednumber', (name,), {})
+        return len(self._find(name))
+
+    def select(self, name):
+        self._record('select', (name,), {})
+        self.selection = self._find(name)
+
+    def unselectall(self):
+        self._record('unselectall', (), {})
+        self.selection = []
+
+    def delete(self):
+        self._record('delete', (), {})
+        for obj in self.selection:
+            for child in [obj] + self._descendants(obj):
+                if id(child) in self._objects:
+                    del self._objects[id(child)]
+                    del self._index[self.path(child)][id(child)]
+        self.selection = []
+
+    def addtogroup(self, group):
+        # moves the selection into the group, a missing group is created at the top level
+        self._record('addtogroup', (group,), {})
+        group = group.removeprefix('::model::')
+        if not [obj for obj in self._find(group) if obj['type'] == 'group']:
+            self._add('group', group)
+        for obj in self.selection:
+            self._move(obj, obj['name'], group)
+
+    def putv(self, name, value):
+        value = np.array(value)
+        self._record('putv', (name, value), {}, nbytes=value.nbytes)
+        self.variables[name] = value
+
+    def getv(self, name):
+        value = self.variables.get(name)
+        self._record('getv', (name,), {}, nbytes=0 if value is None else np.asarray(value).nbytes)
+        return value
+
+    def eval(self, script):
+        self._record('eval', (script,), {})
+
+
+# the stand-in in place of the lumapi module
+recording = types.SimpleNamespace(FDTD=RecordingFDTD)
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Helpers for building Lumerical FDTD layouts through a lumapi session (fdtd = lumapi.FDTD()).
+# Every lumapi call is a round trip to the solver process, so large numbers of objects are created by a
+# single script evaluation that loops over a matrix sent with putv.
+
+
+def script_value(value):
+    # a python value as Lumerical script literal
+    if isinstance(value, str):
+        return '"' + value.replace('"', '\\"') + '"'
+    if isinstance(value, (bool, np.bool_)):
+        return str(int(value))
+    # repr is the shortest exact representation
+    return repr(float(value))
+
+
+def ring_properties(ring, z):
+    # lumapi properties of a ring from a RING dict (radii and height in μm) at the height z (in m)
+    return {"z": z,
+            "z span": ring["height"] * 1e-6,
+            "inner radius": ring["inner radius"] * 1e-6,
+            "outer radius": ring["outer radius"] * 1e-6,
+            "material": ring["matname"],
+            # default settings
+            "color opacity": 0.5,
+            "override mesh order from material database": 1,
+            "mesh order": 1}
+
+
+def _loop(matrix, rows):
+    # script loop over the rows of the matrix variable, all of them or the 0-based range rows
+    if rows is None:
+        return f'for (i = 1:size({matrix}, 1)) {{'
+    return f'for (i = {rows.start + 1}:{rows.stop}) {{'
+
+
+def _set_lines(matrix, columns, properties):
+    lines = [f'    set({script_value(column)}, {matrix}(i, {k + 1}));' for k, column in enumerate(columns)]
+    lines += [f'    set({script_value(key)}, {script_value(value)});' for key, value in properties.items()]
+    return lines
+
+
+def add_script(matrix, kind, columns, properties, group, rows=None):
+    # Lumerical script that adds one object of the kind (ring, circle, ...) per row of the matrix variable to
+    # the group. The objects are named by their 0-based row, the columns of the row are set as the given
+    # properties, followed by the properties shared by all objects
+    lines = [_loop(matrix, rows),
+             f'    add{kind};',
+             '    set("name", num2str(i - 1));']
+    lines += _set_lines(matrix, columns, properties)
+    lines += [f'    addtogroup({script_value(group)});',
+              '}']
+    return '\n'.join(lines)
+
+
+def set_script(matrix, columns, properties, group, rows=None):
+    # Lumerical script that sets the columns of each row of the matrix variable and the shared properties on
+    # the existing object of the group named by the row
+    lines = [_loop(matrix, rows),
+             f'    select({script_value(group + "::")} + num2str(i - 1));']
+    lines += _set_lines(matrix, columns, properties)
+    lines += ['}']
+    return '\n'.join(lines)
+
+
+def delete_script(group, rows):
+    # Lumerical script that deletes the objects of the group named by the 0-based range rows
+    return '\n'.join([f'for (i = {rows.start}:{rows.stop - 1}) {{',
+                      f'    select({script_value(group + "::")} + num2str(i));',
+                      '    delete;',
+                      '}'])
+
+
+def ring_script(matrix, properties, group):
+    # Lumerical script that adds one ring for every row (x, y in m) of the matrix variable
+    return add_script(matrix, 'ring', ('x', 'y'), properties, group) + f'\nclear({matrix});'
+
+
+def update_script(matrix, properties, group):
+    # Lumerical script that moves the rings 0, 1, ... of the group to the rows (x, y in m) of the matrix
+    # variable and sets the properties on all of them
+    return set_script(matrix, ('x', 'y'), properties, group) + f'\nclear({matrix});'
+
+
+def update_rings(fdtd, points, group='RINGS', properties=None):
+    # rewrites the existing rings of the group in place, one per (x, y) point (in μm), in one script
+    # evaluation. properties (see ring_properties) are set on every ring
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0:
+        return
+    fdtd.putv('ring_positions', points * 1e-6)
+    fdtd.eval(update_script('ring_positions', properties or {}, group))
+
+
+def add_rings(fdtd, points, ring, z, group='RINGS', batched=True):
+    # adds a ring at every (x, y) point (in μm) to the group. batched sends all positions as one matrix and
+    # creates the rings with a single script evaluation, so the number of round trips does not grow with
+    # the number of rings. batched=False issues the calls ring by ring
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    properties = ring_properties(ring, z)
+    if batched:
+        if len(points) == 0:
+            return
+        fdtd.putv('ring_positions', points * 1e-6)
+        fdtd.eval(ring_script('ring_positions', properties, group))
+        return
+
+    for i, (x, y) in enumerate(points):
+        name = str(i)
+        fdtd.addring()
+        fdtd.set('name', name)
+        coordinates = {"x": x * 1e-6,
+                       "y": y * 1e-6,
+                       "z": properties["z"],
+                       "z span": properties["z span"],
+                       "inner radius": properties["inner radius"],
+                       "outer radius": properties["outer radius"]}
+        fdtd.set(coordinates)
+        fdtd.select(name)
+        fdtd.set('material', properties["material"])
+        # default settings
+        fdtd.set('color opacity', properties["color opacity"])
+        fdtd.set('override mesh order from material database',
+                 properties["override mesh order from material database"])
+        fdtd.set('mesh order', properties["mesh order"])
+        fdtd.addtogroup(group)
+
+
+class ObjectArray:
+    # a group of objects of one kind named 0, 1, ..., e.g. the scatterers of a crystal. The per-object
+    # properties (columns, in SI units) come from the rows of a matrix, the others are shared by all objects.
+    # update rewrites the existing objects in place and adds or deletes objects only when their number
+    # changes, with one matrix and one script evaluation
+    def __init__(self, fdtd, kind, columns, group):
+        self.fdtd = fdtd
+        self.kind = kind
+        self.columns = tuple(columns)
+        self.group = group
+        self.values = np.empty((0, len(self.columns)))
+        self.properties = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def update(self, values, properties):
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.columns))
+        changed = {key: value for key, value in properties.items()
+                   if key not in self.properties or not np.array_equal(self.properties[key], value)}
+        kept = min(len(values), len(self))
+        scripts = []
+        if kept and (changed or not np.array_equal(values[:kept], self.values[:kept])):
+            scripts.append(set_script('object_values', self.columns, changed, self.group, range(0, kept)))
+        if len(values) > len(self):
+            scripts.append(add_script('object_values', self.kind, self.columns, properties, self.group,
+                                      range(len(self), len(values))))
+        elif len(values) < len(self):
+            scripts.append(delete_script(self.group, range(len(values), len(self))))
+
+        if scripts:
+            if len(values):
+                self.fdtd.putv('object_values', values)
+                scripts.append('clear(object_values);')
+            self.fdtd.eval('\n'.join(scripts))
+        self.values = values
+        self.properties = dict(properties)
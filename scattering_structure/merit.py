@@ -0,0 +1,249 @@
+import numpy as np
+
+from .analysis import nearest_neighbour_distances, number_variance
+from .pairwise import mean_rms_distance
+from .structure_factor import radial_average, structure_factor
+
+
+class RmsAccumulator:
+    # running sums for the mean RMS distance while points are added one by one.
+    # with S = sum(p_j) and Q = sum(|p_j|^2) the inner sum of point i is
+    #   sum_j |p_i - p_j|^2 = n |p_i|^2 - 2 p_i . S + Q
+    # so adding a point is O(1) and evaluating the RMS is a single O(N) vectorized pass
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self._origin = None
+        self._points = np.empty((capacity, 2))
+        self._sum = np.zeros(2)
+        self._sum_sq = 0.0
+
+    def add(self, point):
+        if self._origin is None:
+            # work relative to the first point to keep the sums small
+            self._origin = np.array(point, dtype=float)
+        p = np.asarray(point, dtype=float) - self._origin
+        if self.n == len(self._points):
+            self._points = np.concatenate([self._points, np.empty_like(self._points)])
+        self._points[self.n] = p
+        self._sum += p
+        self._sum_sq += p @ p
+        self.n += 1
+
+    def remove(self, point):
+        p = np.asarray(point, dtype=float) - self._origin
+        index = np.flatnonzero(np.all(self._points[:self.n] == p, axis=1))[0]
+        # the last point takes the place of the removed one
+        self._points[index] = self._points[self.n - 1]
+        self._sum -= p
+        self._sum_sq -= p @ p
+        self.n -= 1
+
+    def value(self):
+        if self.n == 0:
+            return 0
+        p = self._points[:self.n]
+        inner = self.n * np.sum(p * p, axis=1) - 2 * p @ self._sum + self._sum_sq
+        return np.mean(np.sqrt(np.maximum(inner, 0) / self.n))
+
+
+class DensityAccumulator:
+    # the density only depends on the number of points
+    def __init__(self, scatterer_radius, area):
+        self.n = 0
+        self._area_per_point = np.pi * scatterer_radius ** 2 / area
+
+    def add(self, point):
+        self.n += 1
+
+    def remove(self, point):
+        self.n -= 1
+
+    def value(self):
+        return self.n * self._area_per_point
+
+
+class NearestNeighbourAccumulator:
+    # exact nearest neighbour distance of every point, kept up to date on a dict of grid cells. A new point
+    # can only be the nearest neighbour of the points in its 3x3 cell neighbourhood and of the few isolated
+    # points without a neighbour closer than one cell size, which are kept in a separate index array. The
+    # distance of the new point itself comes from an expanding ring search, so value() is a single O(N) pass
+    def __init__(self, cell_size, statistic=np.mean):
+        self.n = 0
+        self.cell_size = cell_size
+        self.statistic = statistic
+        self._points = np.empty((1024, 2))
+        self._distances = np.empty(1024)
+        self._cells = {}
+        self._isolated = np.empty(0, dtype=int)
+
+    def add(self, point):
+        p = np.asarray(point, dtype=float)
+        if self.n == len(self._points):
+            self._points = np.concatenate([self._points, np.empty_like(self._points)])
+            self._distances = np.concatenate([self._distances, np.empty_like(self._distances)])
+        cx, cy = self._cell(p)
+        neighbours = np.array(self._ring(cx, cy, 0) + self._ring(cx, cy, 1), dtype=int)
+        distance = np.inf
+        if len(neighbours):
+            d = np.hypot(*(self._points[neighbours] - p).T)
+            self._distances[neighbours] = np.minimum(self._distances[neighbours], d)
+            distance = d.min()
+        # beyond one cell size a closer point could lie outside the 3x3 neighbourhood
+        if distance > self.cell_size:
+            distance = self._nearest(p, cx, cy)
+        if len(self._isolated):
+            d = np.hypot(*(self._points[self._isolated] - p).T)
+            self._distances[self._isolated] = np.minimum(self._distances[self._isolated], d)
+            self._isolated = self._isolated[self._distances[self._isolated] >= self.cell_size]
+        if distance >= self.cell_size:
+            self._isolated = np.append(self._isolated, self.n)
+        self._distances[self.n] = distance
+        self._points[self.n] = p
+        self._cells.setdefault((cx, cy), []).append(self.n)
+        self.n += 1
+
+    def value(self):
+        if self.n < 2:
+            return 0
+        return self.statistic(self._distances[:self.n])
+
+    def _cell(self, p):
+        return int(np.floor(p[0] / self.cell_size)), int(np.floor(p[1] / self.cell_size))
+
+    def _ring(self, cx, cy, r):
+        # indices of the points in the cells at chebyshev distance r from the cell (cx, cy)
+        if r == 0:
+            return list(self._cells.get((cx, cy), ()))
+        cells = [(cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+        cells += [(cx + dx, cy + dy) for dx in (-r, r) for dy in range(-r + 1, r)]
+        return [i for cell in cells for i in self._cells.get(cell, ())]
+
+    def _nearest(self, p, cx, cy):
+        # distance of p in the cell (cx, cy) to the nearest point, after the ring r every point closer than
+        # r cell sizes has been seen. Once the rings would hold more cells than there are points, all points
+        # are compared directly
+        best = np.inf
+        r = 0
+        while (2 * r + 1) ** 2 <= self.n:
+            ring = self._ring(cx, cy, r)
+            if ring:
+                best = min(best, np.hypot(*(self._points[ring] - p).T).min())
+            if best <= r * self.cell_size:
+                return best
+            r += 1
+        if self.n == 0:
+            return np.inf
+        return np.hypot(*(self._points[:self.n] - p).T).min()
+
+
+class StructureFactorPeakAccumulator:
+    # rho(k) on a fixed k grid, adding or removing a point is one O(k) update instead of O(N k)
+    def __init__(self, k, bins):
+        self.n = 0
+        self.k = k
+        self.bins = bins
+        kx, ky = np.meshgrid(k, k)
+        self._k = np.column_stack([kx.ravel(), ky.ravel()])
+        self._rho = np.zeros(len(self._k), dtype=complex)
+
+    def add(self, point):
+        self._rho += np.exp(-1j * (self._k @ np.asarray(point, dtype=float)))
+        self.n += 1
+
+    def remove(self, point):
+        self._rho -= np.exp(-1j * (self._k @ np.asarray(point, dtype=float)))
+        self.n -= 1
+
+    def value(self):
+        if self.n == 0:
+            return 0
+        s = (np.abs(self._rho) ** 2 / self.n).reshape(len(self.k), len(self.k))
+        return np.nanmax(radial_average(self.k, self.k, s, bins=self.bins)[1])
+
+
+# ---------------------------------------
+# REGISTRY
+# ---------------------------------------
+
+class Merit:
+    # evaluate(points, structure) -> value, vectorized over the points. batch(patterns, structure) evaluates
+    # many patterns at once (one evaluate per pattern if not given) and accumulator(structure) returns an
+    # object with add(point), value() and optionally remove(point) for patterns that grow point by point
+    def __init__(self, evaluate, batch=None, accumulator=None):
+        self.evaluate = evaluate
+        self._batch = batch
+        self.accumulator = accumulator
+
+    def evaluate_batch(self, patterns, structure):
+        if self._batch is not None:
+            return np.asarray(self._batch(patterns, structure), dtype=float)
+        return np.array([self.evaluate(pattern, structure) for pattern in patterns], dtype=float)
+
+
+MERITS = {}
+
+
+def register_merit(name, evaluate, batch=None, accumulator=None):
+    # makes name usable as arrangement['measure_of_merit']
+    MERITS[name] = Merit(evaluate, batch, accumulator)
+    return MERITS[name]
+
+
+def get_merit(name):
+    if name not in MERITS:
+        raise TypeError(f'The given measure of merit {name} is not supported')
+    return MERITS[name]
+
+
+def _nn_cell_size(structure):
+    # twice the exclusion distance (4 * scatterer_radius) of the random pattern finds the neighbour of nearly
+    # every point
+    return structure.arrangement.get('merit_nn_cutoff', 8 * structure.scatterer_radius)
+
+
+def _sk_grid(structure):
+    # S(k) is evaluated on a fixed grid from k_min (beyond the forward peak of the box) up to
+    # k_max = 2 pi / (2 scatterer_radius)
+    k_max = structure.arrangement.get('merit_k_max', np.pi / structure.scatterer_radius)
+    k_min = structure.arrangement.get('merit_k_min', 4 * np.pi / np.sqrt(structure.pattern_area()))
+    n = structure.arrangement.get('merit_n_k', 128)
+    return np.linspace(-k_max, k_max, n), np.linspace(k_min, k_max, n // 2)
+
+
+def structure_factor_peak(points, structure):
+    # height of the highest peak of the radially averaged S(|k|)
+    if len(points) == 0:
+        return 0
+    k, bins = _sk_grid(structure)
+    return np.nanmax(radial_average(k, k, structure_factor(points, k, k), bins=bins)[1])
+
+
+def local_density_variance(points, structure):
+    # variance of the number density in circular windows of radius arrangement['merit_window']
+    # (10 scatterer radii by default), at fixed window positions so the value is not noisy
+    radius = structure.arrangement.get('merit_window', 10 * structure.scatterer_radius)
+    if len(points) < 2:
+        return 0
+    try:
+        _, variance = number_variance(points, [radius], n_windows=1000, rng=0)
+    except ValueError:
+        # the pattern is still smaller than one window
+        return np.nan
+    return variance[0] / (np.pi * radius ** 2) ** 2
+
+
+register_merit('rms', lambda points, structure: mean_rms_distance(points),
+               accumulator=lambda structure: RmsAccumulator())
+register_merit('density', lambda points, structure: len(points) * np.pi * structure.scatterer_radius ** 2
+               / structure.pattern_area(),
+               batch=lambda patterns, structure: np.array([len(p) for p in patterns]) * np.pi
+               * structure.scatterer_radius ** 2 / structure.pattern_area(),
+               accumulator=lambda structure: DensityAccumulator(structure.scatterer_radius,
+                                                                structure.pattern_area()))
+register_merit('nn_mean', lambda points, structure: np.mean(nearest_neighbour_distances(points)),
+               accumulator=lambda structure: NearestNeighbourAccumulator(_nn_cell_size(structure), np.mean))
+register_merit('nn_std', lambda points, structure: np.std(nearest_neighbour_distances(points)),
+               accumulator=lambda structure: NearestNeighbourAccumulator(_nn_cell_size(structure), np.std))
+register_merit('sk_peak', structure_factor_peak,
+               accumulator=lambda structure: StructureFactorPeakAccumulator(*_sk_grid(structure)))
+register_merit('local_density_variance', local_density_variance)
@@ -0,0 +1,84 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# memory ceiling for the temporaries of one tile in bytes
+DEFAULT_MAX_MEMORY = 64 * 2 ** 20
+
+
+def _as_points(points, dtype):
+    return np.ascontiguousarray(np.asarray(points, dtype=dtype).reshape(-1, 2))
+
+
+def _tile_size(max_memory, itemsize):
+    # a (t x t) tile needs about four temporaries of its size (dx, dy, d^2 and a mask)
+    return max(16, int(np.sqrt(max_memory / (4 * itemsize))))
+
+
+def map_tiles(points, func, max_memory=DEFAULT_MAX_MEMORY, dtype=np.float64, n_threads=1):
+    # evaluates func(rows, cols, d2) on square tiles of the squared distance matrix without ever building
+    # the full (N x N) matrix. Only tiles on and above the diagonal are visited, inside the diagonal tiles
+    # the self pairs and the lower triangle are set to inf, so every pair i < j is seen exactly once.
+    # dtype=np.float32 halves the memory traffic at reduced precision, n_threads > 1 evaluates the
+    # tiles in a thread pool (NumPy releases the GIL inside the array operations).
+    p = _as_points(points, dtype)
+    n = len(p)
+    t = _tile_size(max_memory, p.itemsize)
+    tiles = [(i, j) for i in range(0, n, t) for j in range(i, n, t)]
+
+    def evaluate(tile):
+        i, j = tile
+        rows = slice(i, min(i + t, n))
+        cols = slice(j, min(j + t, n))
+        d2 = p[rows, 0, None] - p[None, cols, 0]
+        d2 *= d2
+        dy = p[rows, 1, None] - p[None, cols, 1]
+        dy *= dy
+        d2 += dy
+        if i == j:
+            d2[np.tril_indices(d2.shape[0], m=d2.shape[1])] = np.inf
+        return func(rows, cols, d2)
+
+    if n_threads > 1 and len(tiles) > 1:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            return list(executor.map(evaluate, tiles))
+    return [evaluate(tile) for tile in tiles]
+
+
+def row_sum_squared_distances(points, dtype=np.float64, max_memory=None, n_threads=None):
+    # sum_j |p_i - p_j|^2 for every i. Relative to the centroid c this is n |p_i - c|^2 + sum_j |p_j - c|^2,
+    # so the tiles of squared distances collapse to one O(N) pass and no tile has to be built at all.
+    # max_memory and n_threads are accepted like in map_tiles, but have no effect without tiles
+    p = _as_points(points, dtype)
+    n = len(p)
+    p = p - p.mean(axis=0) if n else p
+    norms = np.einsum('ij,ij->i', p, p)
+    return n * norms + norms.sum()
+
+
+def mean_rms_distance(points, dtype=np.float64, max_memory=None, n_threads=None):
+    # mean over all points of the RMS distance to all points (including itself). max_memory and n_threads
+    # have no effect, see row_sum_squared_distances
+    n = len(points)
+    if n == 0:
+        return 0
+    return float(np.mean(np.sqrt(row_sum_squared_distances(points, dtype=dtype) / n)))
+
+
+def min_pair_distance(points, **kwargs):
+    if len(points) < 2:
+        return np.inf
+    return float(np.sqrt(min(map_tiles(points, lambda rows, cols, d2: np.min(d2), **kwargs))))
+
+
+def pair_distance_histogram(points, bins, **kwargs):
+    # histogram of the distances of all pairs i < j, bins are the bin edges as in np.histogram
+    bins = np.asarray(bins, dtype=float)
+
+    def tile_histogram(rows, cols, d2):
+        d2 = d2[d2 <= bins[-1] ** 2]
+        return np.histogram(np.sqrt(d2), bins=bins)[0]
+
+    counts = np.zeros(len(bins) - 1, dtype=np.int64)
+    for c in map_tiles(points, tile_histogram, **kwargs):
+        counts += c
+    return counts, bins
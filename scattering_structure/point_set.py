@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class PointSet:
+    # scatterer positions as one contiguous (N, 2) array plus optional per-point attributes of shape (N,),
+    # e.g. PointSet(xy, radius=r, inner_radius=r_i). Slices are views of the underlying arrays, masks
+    # and index arrays copy. Iterating yields the (x, y) rows, so code written for lists of tuples
+    # keeps working.
+    def __init__(self, xy, dtype=np.float64, **attributes):
+        self.xy = np.asarray(xy, dtype=dtype).reshape(-1, 2)
+        self.attributes = {}
+        for name, values in attributes.items():
+            values = np.asarray(values)
+            if values.shape[:1] != (len(self.xy),):
+                raise ValueError(f'The attribute {name} has {len(values)} entries for {len(self.xy)} points')
+            self.attributes[name] = values
+
+    @property
+    def x(self):
+        return self.xy[:, 0]
+
+    @property
+    def y(self):
+        return self.xy[:, 1]
+
+    @property
+    def dtype(self):
+        return self.xy.dtype
+
+    @property
+    def shape(self):
+        return self.xy.shape
+
+    @property
+    def nbytes(self):
+        return self.xy.nbytes + sum(values.nbytes for values in self.attributes.values())
+
+    def astype(self, dtype):
+        return PointSet(self.xy, dtype=dtype, **self.attributes)
+
+    def __len__(self):
+        return len(self.xy)
+
+    def __iter__(self):
+        return iter(self.xy)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or dtype == self.xy.dtype:
+            return self.xy.copy() if copy else self.xy
+        return self.xy.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.attributes[key]
+        # single points and column or element indexing (p[i], p[:, 0], p[i, j]) give the plain array, only row
+        # selections (slices, masks and index arrays) are point sets
+        if isinstance(key, (int, np.integer, tuple)):
+            return self.xy[key]
+        xy = self.xy[key]
+        if xy.ndim != 2 or xy.shape[1] != 2:
+            return xy
+        return PointSet(xy, dtype=self.xy.dtype,
+                        **{name: values[key] for name, values in self.attributes.items()})
+
+    def __repr__(self):
+        attributes = ''.join(f', {name}' for name in self.attributes)
+        return f'PointSet({len(self)} points, {self.dtype}{attributes})'
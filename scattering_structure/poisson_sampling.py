@@ -0,0 +1,118 @@
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import poisson_disc
+
+from .bridson import bridson
+
+# memoized Bridson samples keyed by (radius, dims, seed, backend, domain), shared by all structures of a
+# session so that e.g. the targets of a density sweep reuse the radii already sampled for the other targets.
+# samples without a seed are never stored, they are not reproducible.
+MAX_CACHED_SAMPLES = 256
+_samples = OrderedDict()
+
+
+def bridson_sampling(radius, dims, seed=None):
+    # poisson_disc draws from the global NumPy random state, so seeded runs restore it afterwards
+    if seed is None:
+        return poisson_disc.Bridson_sampling(radius=radius, dims=np.asarray(dims, dtype=float))
+    state = np.random.get_state()
+    try:
+        np.random.seed(seed)
+        return poisson_disc.Bridson_sampling(radius=radius, dims=np.asarray(dims, dtype=float))
+    finally:
+        np.random.set_state(state)
+
+
+def poisson_disc_sampling(radius, dims, seed=None, backend='poisson_disc', domain=None):
+    # 'poisson_disc' samples the full (lx x ly) box with the external package, 'builtin' samples
+    # directly into the given domain geometry (the full box by default) with a seeded numpy Generator
+    if backend == 'poisson_disc':
+        return bridson_sampling(radius, dims, seed)
+    elif backend == 'builtin':
+        if domain is None:
+            domain = {'type': 'box', 'lx': dims[0], 'ly': dims[1]}
+        return bridson(radius, domain, rng=np.random.default_rng(seed))
+    else:
+        raise TypeError(f'The given poisson disc backend {backend} is not supported')
+
+
+def _key(radius, dims, seed, backend, domain):
+    domain = None if domain is None else repr(sorted(domain.items()))
+    return round(float(radius), 12), tuple(float(d) for d in dims), seed, backend, domain
+
+
+def sampling_pool(n_jobs):
+    # process pool for sample_radii, opened once per optimization run since starting the workers costs more
+    # than a batch of samples. None (computed serially) for n_jobs <= 1
+    if n_jobs is None or n_jobs <= 1:
+        return contextlib.nullcontext()
+    return ProcessPoolExecutor(max_workers=n_jobs)
+
+
+def sample_radii(radii, dims, seed=None, executor=None, backend='poisson_disc', domain=None):
+    # one Bridson sample per radius, taken from the memo where possible, the missing ones are
+    # computed concurrently in the executor (see sampling_pool) if one is given
+    keys = [_key(r, dims, seed, backend, domain) for r in radii]
+    missing = [r for r, key in zip(radii, keys) if seed is None or key not in _samples]
+
+    if executor is not None and len(missing) > 1:
+        n = len(missing)
+        # forked workers start from the same random state, so unseeded samples get independent seeds.
+        # Seeded samples keep the seed, every radius is sampled with the same random numbers
+        if seed is None:
+            seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence().spawn(n)]
+        else:
+            seeds = [seed] * n
+        computed = list(executor.map(poisson_disc_sampling, missing, [dims] * n, seeds, [backend] * n,
+                                     [domain] * n))
+    else:
+        computed = [poisson_disc_sampling(r, dims, seed, backend, domain) for r in missing]
+    computed = dict(zip((_key(r, dims, seed, backend, domain) for r in missing), computed))
+
+    patterns = []
+    for key in keys:
+        if key in computed:
+            pattern = computed[key]
+            if seed is not None:
+                _samples[key] = pattern
+                if len(_samples) > MAX_CACHED_SAMPLES:
+                    _samples.popitem(last=False)
+        else:
+            pattern = _samples[key]
+            _samples.move_to_end(key)
+        patterns.append(pattern)
+    return patterns
+
+
+def predict_radius(radii, moms, target):
+    # the measures of merit fall off like a power law of the poisson radius (density ~ r^-2),
+    # so fit a line in log-log space through the three samples closest to the target
+    radii = np.asarray(radii, dtype=float)
+    moms = np.asarray(moms, dtype=float)
+    valid = moms > 0
+    if np.count_nonzero(valid) < 2 or target <= 0:
+        return None
+    log_r = np.log(radii[valid])
+    log_m = np.log(moms[valid])
+    closest = np.argsort(np.abs(log_m - np.log(target)))[:3]
+    if np.ptp(log_r[closest]) == 0:
+        return None
+    slope, intercept = np.polyfit(log_r[closest], log_m[closest], 1)
+    if slope == 0:
+        return None
+    return float(np.exp((np.log(target) - intercept) / slope))
+
+
+def bracket_radius(radii, moms, target):
+    # neighbouring samples (sorted by radius) whose measures of merit enclose the target
+    order = np.argsort(radii)
+    radii = np.asarray(radii, dtype=float)[order]
+    above = np.asarray(moms, dtype=float)[order] > target
+    change = np.flatnonzero(above[1:] != above[:-1])
+    if len(change) == 0:
+        return None
+    i = change[np.argmin(radii[change + 1] - radii[change])]
+    return radii[i], radii[i + 1]
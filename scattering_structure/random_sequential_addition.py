@@ -0,0 +1,168 @@
+import numpy as np
+
+from .cell_list import pairs_within
+
+
+class RandomSequentialAddition:
+    # a closed square with the side length of the exclusion distance can hold at most four points
+    # that are at least one exclusion distance apart, so four slots per grid cell are always enough
+    SLOTS = 4
+    # the candidates of one batch that survive the grid test are checked against each other, keeping them
+    # to a small fraction of the grid cells keeps conflicts between them rare
+    SURVIVORS_PER_CELL = 1 / 16
+
+    def __init__(self, bounds, exclusion_distance: float, rng=None, batch_size=1024):
+        # bounds = (min_x, max_x, min_y, max_y) of the region candidates are drawn from
+        self.min_x, self.max_x, self.min_y, self.max_y = bounds
+        self.exclusion_distance = exclusion_distance
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.batch_size = batch_size
+
+        # uniform cell grid with cell size = exclusion distance and one cell of padding around the bounds,
+        # so every candidate has a full 3x3 neighbourhood and points up to one cell outside can be stored
+        self.cell_size = exclusion_distance
+        self.origin = np.array([self.min_x - self.cell_size, self.min_y - self.cell_size])
+        self.nx = int(np.ceil((self.max_x - self.min_x) / self.cell_size)) + 3
+        self.ny = int(np.ceil((self.max_y - self.min_y) / self.cell_size)) + 3
+        # the grid stores the coordinates itself, empty slots are infinitely far away
+        self.grid = np.full((self.ny * self.nx, self.SLOTS, 2), np.inf)
+        self.counts = np.zeros(self.ny * self.nx, dtype=np.int64)
+
+        # accepted points in the order they were placed
+        self.n = 0
+        self._buffer = np.empty((1024, 2))
+
+    # ---------------------------------------
+    # GRID
+    # ---------------------------------------
+
+    def _cells(self, points):
+        ij = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return ij[:, 0], ij[:, 1]
+
+    def _reserve(self, n):
+        capacity = self._buffer.shape[0]
+        if self.n + n <= capacity:
+            return
+        while capacity < self.n + n:
+            capacity *= 2
+        buffer = np.empty((capacity, 2))
+        buffer[:self.n] = self._buffer[:self.n]
+        self._buffer = buffer
+
+    def _insert(self, points):
+        n = len(points)
+        if n == 0:
+            return
+        self._reserve(n)
+        self._buffer[self.n:self.n + n] = points
+        self.n += n
+
+        cx, cy = self._cells(points)
+        if np.any((cx < 0) | (cx >= self.nx) | (cy < 0) | (cy >= self.ny)):
+            raise ValueError('Points have to lie within one exclusion distance of the sampling bounds')
+        cells = cy * self.nx + cx
+        # rank points that fall into the same cell to give each one its own slot
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+        first = np.r_[True, sorted_cells[1:] != sorted_cells[:-1]]
+        position = np.arange(n)
+        rank = position - np.maximum.accumulate(np.where(first, position, 0))
+        slots = self.counts[sorted_cells] + rank
+        if np.any(slots >= self.SLOTS):
+            raise ValueError('Too many points in one grid cell, the points violate the exclusion distance')
+        self.grid[sorted_cells, slots] = points[order]
+        np.add.at(self.counts, sorted_cells, 1)
+
+    def _free_of_neighbours(self, candidates, chunk=4096):
+        # test each candidate against the accepted points in its 3x3 cell neighbourhood,
+        # in chunks so the gathered (chunk, 9, SLOTS, 2) neighbourhood stays in cache
+        cx, cy = self._cells(candidates)
+        offsets = np.array([-1, 0, 1])
+        cells = ((cy[:, None, None] + offsets[None, :, None]) * self.nx
+                 + (cx[:, None, None] + offsets[None, None, :])).reshape(len(candidates), 9)
+        free = np.empty(len(candidates), dtype=bool)
+        for start in range(0, len(candidates), chunk):
+            c = candidates[start:start + chunk]
+            neighbours = self.grid[cells[start:start + chunk]]
+            dx = neighbours[..., 0] - c[:, 0, None, None]
+            dy = neighbours[..., 1] - c[:, 1, None, None]
+            free[start:start + chunk] = ~np.any(dx * dx + dy * dy < self.exclusion_distance ** 2, axis=(1, 2))
+        return free
+
+    def resolve(self, candidates):
+        # accept/reject flags as if the candidates were tested one after another
+        accepted = self._free_of_neighbours(candidates)
+        survivors = np.flatnonzero(accepted)
+        earlier, later = pairs_within(candidates[survivors], self.exclusion_distance)
+        if len(earlier) == 0:
+            return accepted, len(survivors)
+
+        # survivors that collide with an earlier survivor are decided in rounds: rejected as soon as an
+        # earlier conflicting survivor is accepted, accepted once all earlier conflicting ones are rejected
+        state = np.zeros(len(survivors), dtype=np.int8)  # 0 undecided, 1 accepted, -1 rejected
+        state[np.bincount(later, minlength=len(survivors)) == 0] = 1
+        while np.any(state == 0):
+            accepted_earlier = np.bincount(later[state[earlier] == 1], minlength=len(survivors)) > 0
+            undecided_earlier = np.bincount(later[state[earlier] == 0], minlength=len(survivors)) > 0
+            undecided = state == 0
+            state[undecided & accepted_earlier] = -1
+            state[undecided & ~accepted_earlier & ~undecided_earlier] = 1
+        accepted[survivors[state == -1]] = False
+        return accepted, len(survivors)
+
+    # ---------------------------------------
+    # SAMPLING
+    # ---------------------------------------
+
+    def add_points(self, points):
+        # place fixed points (e.g. an already existing pattern) without testing them
+        self._insert(np.asarray(points, dtype=float).reshape(-1, 2))
+
+    def get_points(self, indices=None):
+        if indices is None:
+            return self._buffer[:self.n].copy()
+        return self._buffer[:self.n][indices]
+
+    def fill(self, num_points=None, max_failures=None):
+        # draw uniform candidates and keep those that are at least one exclusion distance away from all
+        # accepted points. Stops when num_points are placed or after max_failures consecutive rejections,
+        # exactly like drawing and testing one candidate at a time.
+        if num_points is None and max_failures is None:
+            raise ValueError('Either num_points or max_failures has to be given')
+        # a guard against targets that cannot be reached anymore
+        give_up = max_failures if max_failures is not None else 100 * self.batch_size
+
+        low = np.array([self.min_x, self.min_y])
+        high = np.array([self.max_x, self.max_y])
+        start = self.n
+        failures = 0
+        survivor_rate = 1.0
+        while num_points is None or self.n - start < num_points:
+            batch_size = int(np.clip(self.SURVIVORS_PER_CELL * self.nx * self.ny / survivor_rate,
+                                     self.batch_size, 64 * self.batch_size))
+            candidates = self.rng.uniform(low, high, size=(batch_size, 2))
+            accepted, n_survivors = self.resolve(candidates)
+            survivor_rate = max(n_survivors / batch_size, 1e-6)
+
+            # consecutive rejections in front of every accepted candidate
+            accepted_idx = np.flatnonzero(accepted)
+            gaps = np.diff(np.r_[-1, accepted_idx]) - 1
+            if len(gaps):
+                gaps[0] += failures
+            stop = np.flatnonzero(gaps >= give_up)
+            if len(stop):
+                accepted_idx = accepted_idx[:stop[0]]
+            if num_points is not None:
+                accepted_idx = accepted_idx[:num_points - (self.n - start)]
+            self._insert(candidates[accepted_idx])
+
+            if len(stop):
+                break
+            failures = batch_size - 1 - accepted_idx[-1] if len(accepted_idx) else failures + batch_size
+            if failures >= give_up:
+                break
+
+        if num_points is not None and max_failures is None and self.n - start < num_points:
+            raise ValueError(f'Only {self.n - start} of {num_points} scatterers could be placed')
+        return self._buffer[start:self.n].copy()
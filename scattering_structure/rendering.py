@@ -0,0 +1,86 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import EllipseCollection
+
+# above this number of scatterers the points are drawn as a density image instead of single circles
+MAX_MARKERS = 100_000
+# at most this many points are binned for one density image, larger patterns are decimated
+MAX_BINNED = 2_000_000
+
+
+def draw_circles(ax, points, radius, **kwargs):
+    # all scatterers as one collection of circles with their true radius in data units (μm)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    diameter = np.full(len(points), 2 * radius)
+    collection = EllipseCollection(diameter, diameter, np.zeros(len(points)), units='xy', offsets=points,
+                                   offset_transform=ax.transData, **kwargs)
+    ax.add_collection(collection)
+    if len(points):
+        ax.update_datalim(np.r_[points.min(axis=0) - radius, points.max(axis=0) + radius].reshape(2, 2))
+    ax.autoscale_view()
+    return collection
+
+
+def bin_points(points, extent, shape, max_points=MAX_BINNED):
+    # number of points per pixel of a (ny, nx) image covering extent = (min_x, max_x, min_y, max_y).
+    # Same as np.histogram2d with uniform bins, but with a direct index computation. Above max_points
+    # every n-th point is binned and counted n times
+    min_x, max_x, min_y, max_y = extent
+    ny, nx = shape
+    x, y = points[:, 0], points[:, 1]
+    inside = (x >= min_x) & (x < max_x) & (y >= min_y) & (y < max_y)
+    visible = np.asarray(points[inside])
+    step = max(1, int(np.ceil(len(visible) / max_points)))
+    visible = visible[::step]
+    ix = ((visible[:, 0] - min_x) * (nx / (max_x - min_x))).astype(np.int64)
+    iy = ((visible[:, 1] - min_y) * (ny / (max_y - min_y))).astype(np.int64)
+    counts = np.bincount(np.minimum(iy, ny - 1) * nx + np.minimum(ix, nx - 1), minlength=nx * ny)
+    return step * counts.reshape(ny, nx).astype(float)
+
+
+class DensityImage:
+    # the points as an image of scatterers per pixel that is binned again for the visible region
+    # whenever the axes are zoomed or panned, so the detail follows the view
+    def __init__(self, ax, points, resolution=512, max_points=MAX_BINNED, **kwargs):
+        self.ax = ax
+        self.points = np.asarray(points)
+        self.resolution = resolution
+        self.max_points = max_points
+        min_x, min_y = self.points.min(axis=0)
+        max_x, max_y = self.points.max(axis=0)
+        extent = (min_x, max_x + 1e-9 * (max_x - min_x), min_y, max_y + 1e-9 * (max_y - min_y))
+        self.image = ax.imshow(self._bin(extent), extent=extent, origin='lower', interpolation='nearest',
+                               **{'cmap': 'viridis', **kwargs})
+        # matplotlib keeps only weak references to bound methods, the lambdas keep the image alive
+        ax.callbacks.connect('xlim_changed', lambda ax: self._update(ax))
+        ax.callbacks.connect('ylim_changed', lambda ax: self._update(ax))
+
+    def _bin(self, extent):
+        width, height = extent[1] - extent[0], extent[3] - extent[2]
+        nx = self.resolution if width >= height else max(1, int(self.resolution * width / height))
+        ny = self.resolution if height >= width else max(1, int(self.resolution * height / width))
+        return bin_points(self.points, extent, (ny, nx), self.max_points)
+
+    def _update(self, ax):
+        (min_x, max_x), (min_y, max_y) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+        extent = (min_x, max_x, min_y, max_y)
+        if extent == tuple(self.image.get_extent()):
+            return
+        self.image.set_data(self._bin(extent))
+        self.image.set_extent(extent)
+        self.image.autoscale()
+
+
+def draw_points(ax, points, radius, mode='auto', max_markers=MAX_MARKERS, **kwargs):
+    # 'circles' draws every scatterer at its true size, 'density' an image of scatterers per pixel,
+    # 'auto' picks the circles up to max_markers points
+    if mode == 'auto':
+        mode = 'circles' if len(points) <= max_markers else 'density'
+    if mode == 'circles':
+        return draw_circles(ax, points, radius, **kwargs)
+    elif mode == 'density':
+        density = DensityImage(ax, points, **kwargs)
+        plt.colorbar(density.image, ax=ax, label='scatterers per pixel')
+        return density
+    else:
+        raise TypeError(f'The given plot mode {mode} is not supported')
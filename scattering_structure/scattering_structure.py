@@ -1,141 +1,244 @@
+import os
+import tempfile
+
 import numpy as np
-import poisson_disc
 import matplotlib.pyplot as plt
-import math
+
+from .cache import DistributionCache, cache_key, is_cacheable
+from .distribution_io import load_distribution, save_distribution
+from .geometry import SHAPES, center, geometry_area, geometry_outline, reduce_points, reduce_points_to_file
+from .lattice import bravais_lattice, lattice_vectors
+from .merit import get_merit
+from .pairwise import mean_rms_distance
+from .point_set import PointSet
+from .poisson_sampling import bracket_radius, poisson_disc_sampling, predict_radius, sample_radii, sampling_pool
+from .random_sequential_addition import RandomSequentialAddition
+from .rendering import draw_points
+from .structure_factor import radial_average, structure_factor
+from .target_structure_factor import optimize_structure_factor, reciprocal_vectors
+from .tiling import generate_tiled
+from .validation import validate_points
 
 
 class ScatteringStructure:
-    def __init__(self, geometry: dict, arrangement: dict, scatterer_radius: float, position=(0, 0)):
+    def __init__(self, geometry: dict, arrangement: dict, scatterer_radius: float, position=(0, 0),
+                 cache: DistributionCache = None, dtype=np.float64):
         self.center_pos = position
         self.geometry = geometry
         self.arrangement = arrangement
         self.scatterer_radius = scatterer_radius
-
-        self.points = None
-        # create arrangement based on class definition
-        if arrangement['type'] == 'rectangular':
-            self.points = self.create_rectangular_pattern()
-        elif arrangement['type'] == 'tetrahedral':
-            self.points = self.create_tetrahedral_pattern()
-        elif arrangement['type'] == 'random':
-            self.points = self.create_random_pattern()
-        elif arrangement['type'] == 'poisson_disc':
-            self.points = self.create_poisson_disc_sampling_pattern()
-        elif arrangement['type'] == 'load_from_file':
-            self.points = self.load(arrangement['filepath'])
+        # storage type of the point coordinates, np.float32 halves the memory of large patterns
+        self.dtype = dtype
+        # metadata stored next to a loaded distribution
+        self.metadata = None
+
+        # reuse a previously generated arrangement with the same parameters if a cache is given
+        self.cache = cache
+
+        # the points are only generated on first access, see materialize()
+        self._points = None
+        self._reduced_points = None
+        self._fingerprint = None
+        # temporary directory of a tiled pattern without tile_directory, removed with the structure
+        self._tile_directory = None
+
+    @property
+    def points(self):
+        if self._fingerprint != self._current_fingerprint():
+            self.materialize()
+        return self._points
+
+    @property
+    def reduced_points(self):
+        if self._fingerprint != self._current_fingerprint():
+            self.materialize()
+        return self._reduced_points
+
+    def _current_fingerprint(self):
+        # changes of the parameters, also in place, give a new fingerprint and invalidate the points
+        try:
+            key = cache_key(self.geometry, self.arrangement, self.scatterer_radius)
+        except TypeError:
+            # e.g. shapely polygons as vertices
+            key = repr((self.geometry, self.arrangement, self.scatterer_radius))
+        return key, np.dtype(self.dtype).str
+
+    def invalidate(self):
+        # forget the generated points, the next access generates them again
+        self._points = None
+        self._reduced_points = None
+        self._fingerprint = None
+
+    def materialize(self):
+        # generate and reduce the points now, e.g. for batch pipelines, returns the structure itself
+        fingerprint = self._current_fingerprint()
+        points = None
+        if self.cache is not None and is_cacheable(self.arrangement):
+            key = cache_key(self.geometry, self.arrangement, self.scatterer_radius)
+            # tiled patterns stay memory-mapped, also in the cache
+            points = self.cache.get(key, mmap='tile_size' in self.arrangement)
+            if points is None:
+                points = self._create_points()
+                self.cache.put(key, points)
         else:
-            raise TypeError(f'The given arrangement type {self.arrangement} is not supported')
-
-        # reduce arrangement from box to fill a pizza slice or circle
-        self.reduced_points = None
-        if geometry['type'] == 'box':
-            self.reduced_points = self.points
-        elif geometry['type'] == 'circle':
-            self.reduced_points = self._reduce_to_circle()
-        elif geometry['type'] == 'load_from_file':
-            self.reduced_points = self.points  # since the arrangement is already reduced
+            points = self._create_points()
+        self._points = None if points is None else PointSet(points, dtype=self.dtype)
+
+        # reduce arrangement from box to fill the device geometry (circle, annulus, sector, polygon)
+        self._reduced_points = None
+        if self._points is None:
+            pass
+        elif self.geometry['type'] == 'box':
+            self._reduced_points = self._points
+        elif self.geometry['type'] in SHAPES and isinstance(points, np.memmap):
+            # memory-mapped patterns are reduced chunk by chunk into a file next to the tiles
+            filepath = os.path.join(self._scratch_directory(), 'reduced_points.npy')
+            self._reduced_points = PointSet(reduce_points_to_file(self.geometry, points, filepath),
+                                            dtype=self.dtype)
+        elif self.geometry['type'] in SHAPES:
+            self._reduced_points = PointSet(reduce_points(self.geometry, self._points.xy), dtype=self.dtype)
+        elif self.geometry['type'] == 'load_from_file':
+            self._reduced_points = self._points  # since the arrangement is already reduced
         else:
-            raise TypeError(f'The given geometry type {geometry['type']} is not supported')
+            raise TypeError(f"The given geometry type {self.geometry['type']} is not supported")
+        self._fingerprint = fingerprint
+        return self
 
     # ---------------------------------------
     # DIFFERENT SCATTERER DISTRIBUTIONS
     # ---------------------------------------
 
+    def _create_points(self):
+        # create arrangement based on class definition
+        if 'tile_size' in self.arrangement:
+            return self.create_tiled_pattern()
+        elif self.arrangement['type'] == 'rectangular':
+            return self.create_rectangular_pattern()
+        elif self.arrangement['type'] == 'tetrahedral':
+            return self.create_tetrahedral_pattern()
+        elif self.arrangement['type'] == 'lattice':
+            return self.create_lattice_pattern()
+        elif self.arrangement['type'] == 'random':
+            return self.create_random_pattern()
+        elif self.arrangement['type'] == 'poisson_disc':
+            return self.create_poisson_disc_sampling_pattern()
+        elif self.arrangement['type'] == 'target_structure_factor':
+            return self.create_target_structure_factor_pattern()
+        elif self.arrangement['type'] == 'load_from_file':
+            return self.load(self.arrangement['filepath'])
+        else:
+            raise TypeError(f'The given arrangement type {self.arrangement} is not supported')
+
+    def create_tiled_pattern(self):
+        # random or poisson disc pattern generated tile by tile in a process pool, see tiling.py. The tiles
+        # are kept in arrangement['tile_directory'] and the points are returned memory-mapped from one
+        # consolidated file. Without a tile_directory they go to a temporary directory that is removed when
+        # the structure is garbage collected or generates new points
+        directory = self._scratch_directory(new=True)
+        store = generate_tiled(self.geometry, self.arrangement, self.scatterer_radius, directory,
+                               n_workers=self.arrangement.get('n_jobs'), seed=self.arrangement.get('seed'))
+        filepath = store.consolidate(os.path.join(directory, 'points.npy'))
+        return np.load(filepath, mmap_mode='r')
+
+    def _scratch_directory(self, new=False):
+        # arrangement['tile_directory'] or a temporary directory that lives as long as the structure, new=True
+        # replaces the temporary directory of earlier points
+        directory = self.arrangement.get('tile_directory')
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            return directory
+        if new or self._tile_directory is None:
+            self._tile_directory = tempfile.TemporaryDirectory(prefix='tiles_', ignore_cleanup_errors=True)
+        return self._tile_directory.name
+
     def create_rectangular_pattern(self):
         min_x = -0.5*self.geometry['lx']
         max_x = +0.5*self.geometry['lx']
         min_y = -0.5*self.geometry['ly']
         max_y = +0.5*self.geometry['ly']
         dist = self.arrangement['dist']
-        positions = np.array([(x, y)
-                              for x in np.arange(min_x + self.scatterer_radius, max_x - self.scatterer_radius,
-                                                 step=dist)
-                              for y in np.arange(min_y + self.scatterer_radius, max_y - self.scatterer_radius,
-                                                 step=dist)])
+        x = np.arange(min_x + self.scatterer_radius, max_x - self.scatterer_radius, step=dist)
+        y = np.arange(min_y + self.scatterer_radius, max_y - self.scatterer_radius, step=dist)
+        # all (x, y) combinations, x major
+        positions = np.stack(np.broadcast_arrays(x[:, None], y[None, :]), axis=-1).reshape(-1, 2)
 
         return positions
 
     def create_tetrahedral_pattern(self):
-        # TODO does not work
-        max_x = self.geometry['lx']
-        max_y = self.geometry['ly']
-        dist = self.arrangement['dist']
-        sqrt3 = np.sqrt(3)
-
-        positions = []
-        off_center = True  # first iteration will be off_center = False
-        for x in np.arange(0 + self.scatterer_radius, max_x, step=dist):
-            off_center = not off_center
-            for y in np.arange(0, max_y, step=dist * sqrt3):
-                if off_center:
-                    positions.append((x, y))
-                else:
-                    positions.append((x + 0.5 * dist, y))
-            # Offset the x-coordinate by half of the step on every other row
-            x += dist * sqrt3 / 2
-            for y in np.arange(0, max_y, step=dist):
-                positions.append((x, y))
-
-        positions = np.array(positions)
+        # hexagonal lattice with nearest neighbour distance dist
+        return self.create_lattice_pattern(lattice='hexagonal')
+
+    def create_lattice_pattern(self, lattice=None):
+        # Bravais lattice (with basis) from arrangement['lattice'] or the primitive vectors
+        # arrangement['a1'], arrangement['a2'], centered in the box and optionally rotated and shifted
+        arrangement = self.arrangement if lattice is None else {**self.arrangement, 'lattice': lattice}
+        a1, a2, basis = lattice_vectors(arrangement)
+        offset = (0.5 * self.geometry['lx'] + arrangement.get('offset', (0, 0))[0],
+                  0.5 * self.geometry['ly'] + arrangement.get('offset', (0, 0))[1])
+        positions = bravais_lattice(a1, a2,
+                                    bounds=(0 + self.scatterer_radius, self.geometry['lx'] - self.scatterer_radius,
+                                            0 + self.scatterer_radius, self.geometry['ly'] - self.scatterer_radius),
+                                    basis=basis, rotation=arrangement.get('rotation', 0), offset=offset)
+
         return positions
 
     def create_random_pattern(self):
-        # TODO can be done faster
         max_x = self.geometry['lx']
         max_y = self.geometry['ly']
 
+        # random sequential addition on a uniform cell grid, every scatterer keeps a distance of
+        # 4 * scatterer_radius to all others
+        rsa = RandomSequentialAddition(bounds=(0 + self.scatterer_radius, max_x - self.scatterer_radius,
+                                               0 + self.scatterer_radius, max_y - self.scatterer_radius),
+                                       exclusion_distance=4 * self.scatterer_radius,
+                                       rng=self._rng())
+
         # if the structure should just be plainly instanced
         if not self.arrangement['optimization']:
-            points = []
-            num_points = self.arrangement['num_points']
-            while len(points) < num_points:
-                # create random point in given range
-                x = np.random.uniform(0 + self.scatterer_radius, max_x - self.scatterer_radius)
-                y = np.random.uniform(0 + self.scatterer_radius, max_y - self.scatterer_radius)
-                # only as point to list if it doesn't hit rest of the
-                valid = True
-                for px, py in points:
-                    distance = np.sqrt((x - px) ** 2 + (y - py) ** 2)
-                    if distance < 4 * self.scatterer_radius:
-                        valid = False
-                        break
-                if valid:
-                    points.append((x, y))
-            return np.array(points)
+            return rsa.fill(num_points=self.arrangement['num_points'])
         # otherwise a point is added until the target MOM is hit
         else:
-            points = []
-            # the loop is done until it fails
+            # points are added until 100 consecutive tries fail
             # only later the solution with the closest to target_rms is picked
+            points = rsa.fill(max_failures=100)
             target_mom = self.arrangement['target_mom']
-            best_points = []
+            # the points are only ever appended, so the best state is fully described by its length
+            merit = self._merit_accumulator()
+            if merit is None:
+                # 'merit_n_coarse': None in the arrangement compares every prefix
+                n_coarse = self.arrangement.get('merit_n_coarse', 128)
+                return points[:self._best_prefix(points, target_mom, n_coarse)].copy()
+            best_n = 0
             best_mom = 0
-            i = 0
-            while i < 100:
-                # create random point in given range
-                x = np.random.uniform(0 + self.scatterer_radius, max_x - self.scatterer_radius)
-                y = np.random.uniform(0 + self.scatterer_radius, max_y - self.scatterer_radius)
-                # only as point to list if it doesn't hit rest of the
-                point_valid = True
-                for px, py in points:
-                    distance = np.sqrt((x - px) ** 2 + (y - py) ** 2)
-                    if distance < 4 * self.scatterer_radius:
-                        point_valid = False
-                        # set false-try counter
-                        i += 1
-                        break
-                if point_valid:
-                    # reset false-try counter
-                    i = 0
-                    points.append((x, y))
-                    # test if this is the best solution until now
-                    current_mom = self._measure_of_merit(points)
-                    # print(self.arrangement['measure_of_merit'], "=", current_mom)
-                    if abs(current_mom - target_mom) < abs(best_mom - target_mom):
-                        # print('IMPROVED!')
-                        best_mom = current_mom
-                        best_points = points
-            return np.array(best_points)
+            for n, point in enumerate(points, start=1):
+                # test if this is the best solution until now
+                merit.add(point)
+                current_mom = merit.value()
+                if abs(current_mom - target_mom) < abs(best_mom - target_mom):
+                    best_mom = current_mom
+                    best_n = n
+            return points[:best_n].copy()
+
+    def _best_prefix(self, points, target_mom, n_coarse=128):
+        # length of the prefix closest to target_mom for merits without an incremental update: a batch of
+        # evenly spaced lengths first, then every length between the neighbours of the best one.
+        # This is an approximation, it finds the best prefix only where the merit changes slowly with the
+        # number of points (as the density and the spacings do), a narrow dip between two coarse lengths is
+        # missed, n_coarse=None compares every prefix instead. 0 if no prefix has a finite merit
+        merit = get_merit(self.arrangement['measure_of_merit'])
+        if len(points) == 0:
+            return 0
+        n_coarse = len(points) if n_coarse is None else min(n_coarse, len(points))
+        lengths = np.unique(np.linspace(1, len(points), n_coarse).astype(int))
+        errors = np.abs(merit.evaluate_batch([points[:n] for n in lengths], self) - target_mom)
+        if np.all(np.isnan(errors)):
+            return 0
+        best = int(np.nanargmin(errors))
+        if len(lengths) == len(points):
+            return int(lengths[best])
+        fine = np.arange(lengths[max(best - 1, 0)], lengths[min(best + 1, len(lengths) - 1)] + 1)
+        errors = np.abs(merit.evaluate_batch([points[:n] for n in fine], self) - target_mom)
+        return int(fine[np.nanargmin(errors)])
 
     def create_poisson_disc_sampling_pattern(self):
         max_x = self.geometry['lx']
@@ -144,28 +247,58 @@ class ScatteringStructure:
         if not self.arrangement['optimization']:
             # generate point pattern via Bridson's poisson sampling algorithm
             # https://www.cs.ubc.ca/~rbridson/docs/bridson-siggraph07-poissondisk.pdf
-            points = poisson_disc.Bridson_sampling(radius=self.arrangement['poisson_radius'],
-                                                   dims=np.array([max_x, max_y]))
+            points = poisson_disc_sampling(radius=self.arrangement['poisson_radius'],
+                                           dims=np.array([max_x, max_y]),
+                                           seed=self.arrangement.get('seed'),
+                                           backend=self.arrangement.get('backend', 'poisson_disc'),
+                                           domain=self._sampling_domain())
 
             return points
 
+        # fit the measure of merit over the radius and predict the radius that hits the target
+        elif self.arrangement.get('optimizer', 'grid') == 'predictive':
+            return self._poisson_pattern_prediction()
+
         # otherwise a point is added until the target MOM is hit
         else:
             # define a initial radius range
             rng = (8 - 2) * self.scatterer_radius
             middle = 5 * self.scatterer_radius
-            for i in range(self.arrangement['optimization_outer_n']):
-                # print(i)
-                # get the pattern closest to target mom in initial range
-                pattern, middle = self._poisson_pattern_optimisation(start=middle - 0.5 * rng,
-                                                                     stop=middle + 0.5 * rng,
-                                                                     n=self.arrangement['optimization_inner_n'])
-                # cut the range by half
-                rng *= 0.5
+            # one process pool for all iterations
+            with sampling_pool(self.arrangement.get('n_jobs', 1)) as executor:
+                for i in range(self.arrangement['optimization_outer_n']):
+                    # print(i)
+                    # get the pattern closest to target mom in initial range
+                    pattern, middle = self._poisson_pattern_optimisation(start=middle - 0.5 * rng,
+                                                                         stop=middle + 0.5 * rng,
+                                                                         n=self.arrangement['optimization_inner_n'],
+                                                                         executor=executor)
+                    # cut the range by half
+                    rng *= 0.5
 
             return pattern
 
-    def _poisson_pattern_optimisation(self, start, stop, n):
+    def create_target_structure_factor_pattern(self):
+        # stealthy pattern: S(k) is suppressed for all k_min < |k| <= k_max of the periodic box. Instead of
+        # k_max the fraction chi of constrained degrees of freedom can be given, k vectors / (2 num_points)
+        max_x = self.geometry['lx']
+        max_y = self.geometry['ly']
+        num_points = self.arrangement['num_points']
+        if 'k_max' in self.arrangement:
+            k_max = self.arrangement['k_max']
+        else:
+            k_max = np.sqrt(16 * np.pi * self.arrangement['chi'] * num_points / (max_x * max_y))
+        k = reciprocal_vectors(max_x, max_y, k_max, self.arrangement.get('k_min', 0))
+
+        # start from a random pattern that already keeps the exclusion distance
+        rsa = RandomSequentialAddition(bounds=(0, max_x, 0, max_y), exclusion_distance=4 * self.scatterer_radius,
+                                       rng=self._rng())
+        points = rsa.fill(num_points=num_points)
+        return optimize_structure_factor(points, (max_x, max_y), k, exclusion_distance=4 * self.scatterer_radius,
+                                         overlap_weight=self.arrangement.get('overlap_weight'),
+                                         max_iterations=self.arrangement.get('max_iterations', 1000))
+
+    def _poisson_pattern_optimisation(self, start, stop, n, executor=None):
         # initialize
         max_x = self.geometry['lx']
         max_y = self.geometry['ly']
@@ -175,10 +308,11 @@ class ScatteringStructure:
         target_mom = self.arrangement['target_mom']
         best_pattern = []
         best_radius = 0
-        # compute a pattern for each radius
-        for r in radii:
-            # print(r)
-            pattern = poisson_disc.Bridson_sampling(radius=r, dims=np.array([max_x, max_y]))
+        # compute a pattern for each radius, previously sampled radii come from the memo
+        patterns = sample_radii(radii, dims=(max_x, max_y), seed=self.arrangement.get('seed'), executor=executor,
+                                backend=self.arrangement.get('backend', 'poisson_disc'),
+                                domain=self._sampling_domain())
+        for r, pattern in zip(radii, patterns):
             current_mom = self._measure_of_merit(pattern)
             # check if measure of merit has improved
             if abs(current_mom - target_mom) < abs(best_mom - target_mom):
@@ -188,47 +322,80 @@ class ScatteringStructure:
 
         return best_pattern, best_radius
 
+    def _poisson_pattern_prediction(self):
+        # evaluates the same number of samples as the grid optimisation at most, but places every new
+        # batch of radii at the predicted radius, inside the bracket that encloses the target
+        max_x = self.geometry['lx']
+        max_y = self.geometry['ly']
+        target_mom = self.arrangement['target_mom']
+        budget = self.arrangement['optimization_outer_n'] * self.arrangement['optimization_inner_n']
+        tolerance = self.arrangement.get('tolerance', 1e-2)
+        n_jobs = self.arrangement.get('n_jobs', 1)
+        batch = max(n_jobs, 1)
+        samples = {}  # radius -> (measure of merit, pattern)
+
+        def evaluate(radii):
+            radii = [r for r in radii if r > 0 and r not in samples][:budget - len(samples)]
+            patterns = sample_radii(radii, dims=(max_x, max_y), seed=self.arrangement.get('seed'), executor=executor,
+                                    backend=self.arrangement.get('backend', 'poisson_disc'),
+                                    domain=self._sampling_domain())
+            for r, pattern in zip(radii, patterns):
+                samples[r] = (self._measure_of_merit(pattern), pattern)
+            return len(radii)
+
+        # one process pool for all batches, evaluate uses it
+        with sampling_pool(n_jobs) as executor:
+            # start with the same radius range as the grid optimisation
+            evaluate(np.linspace(2 * self.scatterer_radius, 8 * self.scatterer_radius, max(batch, 3)))
+            while len(samples) < budget:
+                radii = list(samples)
+                moms = [samples[r][0] for r in radii]
+                best = min(radii, key=lambda r: abs(samples[r][0] - target_mom))
+                if abs(samples[best][0] - target_mom) <= tolerance * abs(target_mom):
+                    break
+
+                bracket = bracket_radius(radii, moms, target_mom)
+                predicted = predict_radius(radii, moms, target_mom)
+                if bracket is not None and (predicted is None or not bracket[0] < predicted < bracket[1]):
+                    # bisect if the fit points outside the bracket
+                    predicted = 0.5 * (bracket[0] + bracket[1])
+                elif predicted is None:
+                    # no bracket and no fit yet, widen the search range
+                    predicted = 0.5 * min(radii) if samples[best][0] < target_mom else 2 * max(radii)
+
+                # spread the parallel evaluations around the prediction, within the bracket
+                width = 0.5 * (bracket[1] - bracket[0]) if bracket is not None else 0.1 * predicted
+                candidates = predicted + width * np.linspace(-0.5, 0.5, batch) if batch > 1 else [predicted]
+                if bracket is not None:
+                    candidates = np.clip(candidates, *bracket)
+                if evaluate(candidates) == 0:
+                    break
+
+        best = min(samples, key=lambda r: abs(samples[r][0] - target_mom))
+        return samples[best][1]
+
     # ---------------------------------------
-    # REDUCE TO SPECIFIC GEOMETRIES
+    # OTHER FUNCTIONS
     # ---------------------------------------
 
-    def _reduce_to_circle(self):
-        circle_radius = self.geometry['circle_radius']
-        lx = self.geometry['lx']
-        ly = self.geometry['ly']
-
-        # Calculate the coordinates of the center of the circle
-        center_x = lx / 2
-        center_y = ly / 2
-
-        # Create a list to store the filtered and transformed points
-        new_points = []
-
-        # Calculate the square of the circle radius for faster comparison
-        circle_radius_squared = circle_radius ** 2
-
-        # Iterate through the original points
-        for x, y in self.points:
-            # Calculate the squared distance from the point to the center of the circle
-            distance_squared = (x - center_x) ** 2 + (y - center_y) ** 2
-
-            # Check if the squared distance is less than or equal to the squared circle radius
-            if distance_squared <= circle_radius_squared:
-                # Transform the point to have the center of the circle at (0, 0)
-                transformed_x = x - center_x
-                transformed_y = y - center_y
-
-                # Append the transformed point to the new_points list
-                new_points.append((transformed_x, transformed_y))
-
-        return new_points
+    def _sampling_domain(self):
+        # the built-in Bridson backend samples directly into the device geometry instead of the full box
+        if self.arrangement.get('backend', 'poisson_disc') != 'builtin':
+            return None
+        if self.geometry['type'] in SHAPES and self.geometry['type'] != 'box':
+            return self.geometry
+        return None
 
-    def _reduce_to_pizza_slice(self):
-        pass
+    def pattern_area(self):
+        # area the points were generated in, the full box unless they were sampled into the geometry
+        domain = self._sampling_domain()
+        if domain is None:
+            return self.geometry['lx'] * self.geometry['ly']
+        return geometry_area(domain)
 
-    # ---------------------------------------
-    # OTHER FUNCTIONS
-    # ---------------------------------------
+    def _rng(self):
+        # an optional 'seed' in the arrangement makes the random patterns reproducible
+        return np.random.default_rng(self.arrangement.get('seed'))
 
     def _measure_of_merit(self, points=None):
         # use class-set distribution of points
@@ -237,40 +404,27 @@ class ScatteringStructure:
         # otherwise use given
         else:
             p = points
-        # compute rms
-        n = len(p)
-        if self.arrangement['measure_of_merit'] == 'rms':
-            return self.rms(p)
-        elif self.arrangement['measure_of_merit'] == 'density':
-            return self.density(p)
-        else:
-            raise TypeError('The given measure of merit', self.arrangement['measure_of_merit'], 'is not supported')
+        # any merit of the registry in merit.py, unknown names raise a TypeError
+        return get_merit(self.arrangement['measure_of_merit']).evaluate(p, self)
+
+    def _merit_accumulator(self):
+        # incremental counterpart of _measure_of_merit for points that are added one by one,
+        # None if the merit has no incremental update
+        merit = get_merit(self.arrangement['measure_of_merit'])
+        return None if merit.accumulator is None else merit.accumulator(self)
 
-    def rms(self, points=None):
+    def rms(self, points=None, **kwargs):
         # use class-set distribution of points
         if points is None:
             p = self.points
         # otherwise use given
         else:
             p = points
-        # compute rms
-        n = len(p)
-        if n == 0:
-            return 0
-        else:
-            outer_sum = 0
-            for (px, py) in p:
-                inner_sum = 0
-                for (x, y) in p:
-                    inner_sum += math.dist([px, py], [x, y]) ** 2
-                outer_sum += (inner_sum / n) ** 0.5
-            outer_sum *= 1 / n
-
-            return outer_sum
+        # mean over all points of the rms distance to all other points, kwargs are dtype, max_memory and
+        # n_threads of pairwise.mean_rms_distance
+        return mean_rms_distance(p, **kwargs)
 
     def density(self, points=None):
-        max_x = self.geometry['lx']
-        max_y = self.geometry['ly']
         # use class-set distribution of points
         if points is None:
             p = self.points
@@ -279,40 +433,68 @@ class ScatteringStructure:
             p = points
 
         # compute density
-        density = (len(p) * np.pi * self.scatterer_radius ** 2) / (max_x * max_y)
+        density = (len(p) * np.pi * self.scatterer_radius ** 2) / self.pattern_area()
 
         return density
 
-    def plot_distribution(self):
-        # Unzip data into x and y
-        x, y = zip(*self.points)
-
-        # Create a scatter plot with marker size
-        plt.scatter(x, y, s=np.pi * self.scatterer_radius ** 2)
+    def structure_factor(self, kx, ky, reduced=True, radial_bins=None, **kwargs):
+        # S(k) of the device (reduced=True) or of the whole generated pattern on the (ky x kx) grid.
+        # With radial_bins the azimuthal average (|k|, S(|k|)) is returned instead
+        p = self.reduced_points if reduced else self.points
+        s = structure_factor(p, kx, ky, **kwargs)
+        if radial_bins is not None:
+            return radial_average(kx, ky, s, bins=radial_bins)
+        return s
+
+    def validate(self, spacing=None, strict=False):
+        # pairs of scatterers closer than spacing (2 * scatterer_radius by default, where they touch),
+        # duplicates and points outside the device. strict=True raises a ValueError for invalid points
+        if self.reduced_points is None:
+            raise ValueError('There is no distribution to validate')
+        spacing = 2 * self.scatterer_radius if spacing is None else spacing
+        points = np.asarray(self.reduced_points)
+        geometry, arrangement = self.geometry, self.arrangement
+        if geometry['type'] == 'load_from_file' and self.metadata is not None:
+            # the device the loaded distribution was generated for
+            geometry = self.metadata.get('geometry', geometry)
+            arrangement = self.metadata.get('arrangement', arrangement)
+        if geometry['type'] not in SHAPES:
+            geometry = None
+        elif geometry['type'] == 'box' and arrangement['type'] != 'rectangular':
+            # only the rectangular pattern is generated around (0, 0)
+            points = points - center(geometry)
+
+        report = validate_points(points, spacing, geometry)
+        if strict and not report.valid:
+            raise ValueError(f'Invalid scatterer distribution, {report}')
+        return report
+
+    def plot_distribution(self, mode='auto'):
+        # scatterers at their true size up to rendering.MAX_MARKERS points, a density image above
+        # (mode='circles' or 'density' to choose)
+        ax = plt.gca()
+        draw_points(ax, self.points, self.scatterer_radius, mode=mode)
 
         # Set aspect ratio to equal
-        plt.gca().set_aspect('equal')
+        ax.set_aspect('equal')
         plt.xlabel('μm')
         plt.ylabel('μm')
 
         # Display the plot
         plt.show()
 
-    def plot_device(self):
-        # Unzip reduced points into x and y
-        x, y = zip(*self.reduced_points)
-
-        # Create a scatter plot of reduced points
-        plt.scatter(x, y, s=np.pi * self.scatterer_radius ** 2)
+    def plot_device(self, mode='auto'):
+        # reduced points, drawn like in plot_distribution
+        ax = plt.gca()
+        draw_points(ax, self.reduced_points, self.scatterer_radius, mode=mode)
 
-        # Plot the circle
-        circle_radius = self.geometry['circle_radius']
-        circle = plt.Circle((0, 0), circle_radius, color='r', fill=False,
-                            label=f'Circle r = {self.geometry['circle_radius']} μm')
-        plt.gca().add_patch(circle)
+        # Plot the outline of the device
+        if self.geometry['type'] in SHAPES:
+            outline_x, outline_y = geometry_outline(self.geometry)
+            plt.plot(outline_x, outline_y, color='r', label=f"{self.geometry['type']} outline")
 
         # Set aspect ratio to equal
-        plt.gca().set_aspect('equal')
+        ax.set_aspect('equal')
         plt.xlabel('μm')
         plt.ylabel('μm')
 
@@ -322,22 +504,22 @@ class ScatteringStructure:
         # Display the plot
         plt.show()
 
-    def save_device(self, filepath):
+    def save_device(self, filepath, compressed=False):
+        # the format follows the extension: .txt (tab separated), .npy (memory-mappable) or .npz
         try:
-            with open(filepath, 'w') as file:
-                for x, y in self.reduced_points:
-                    file.write(f"{x}\t{y}\n")
+            metadata = {'geometry': self.geometry,
+                        'arrangement': self.arrangement,
+                        'scatterer_radius': self.scatterer_radius,
+                        'seed': self.arrangement.get('seed')}
+            save_distribution(filepath, self.reduced_points.xy, metadata=metadata, compressed=compressed)
             print(f"Distribution saved to {filepath}")
         except Exception as e:
             print(f"Error saving distribution: {str(e)}")
 
     def load(self, filepath):
+        # .npy files are memory-mapped, slices of the points are only read from disk when used
         try:
-            points = []
-            with open(filepath, 'r') as file:
-                for line in file:
-                    x, y = map(float, line.strip().split('\t'))
-                    points.append((x, y))
+            points, self.metadata = load_distribution(filepath, mmap=self.arrangement.get('mmap', True))
             print(f"Distribution loaded from {filepath}")
             return points
         except Exception as e:
@@ -0,0 +1,176 @@
+# The single gaussian slab device of the FDTD builds as a spec (see fdtd_spec.py): a Si / SiO2 / Si3N4 stack
+# with etched rings in the Si3N4 slab, lit from above by a gaussian beam. The build scripts are variants of
+# slab_device_spec that change or add single objects of the spec
+
+## Constants
+WAVELENGTH_START = 1.5  # [um]
+WAVELENGTH_STOP = 1.6  # [um]
+BLOCK_LENGTH = 210  # [um]
+BLOCK_WIDTH = 210  # [um]
+SIMULATION_HEIGHT = 20  # [um]
+MIN_MESH_STEP = 0.04  # [um]
+WG_MESH_STEP = 0.005  # [um]
+
+WG = {
+    "length": BLOCK_LENGTH,
+    "width": BLOCK_WIDTH,
+    "height": 0.22,
+    "matname": "Si3N4 (Silicon Nitride) - Luke"
+}
+
+BOX = {
+    "length": BLOCK_LENGTH,
+    "width": BLOCK_WIDTH,
+    "height": 3,
+    "matname": "SiO2 (Glass) - Palik"
+}
+
+SUB = {
+    "length": BLOCK_LENGTH,
+    "width": BLOCK_WIDTH,
+    "height": 1,
+    "matname": "Si (Silicon) - Palik"
+}
+
+RING = {
+    "inner radius": 0.9384,
+    "outer radius": 1.3432,
+    "height": 0.070,
+    "matname": "etch"
+}
+
+# z range of the Si3N4 slab in m
+WG_Z = {"z min": (SUB["height"] + BOX["height"]) * 1e-6,
+        "z max": (SUB["height"] + BOX["height"] + WG["height"]) * 1e-6}
+
+
+def slab_device_spec(points, injection_angle=0, ring_z=None):
+    # the stack, the rings at the points (in μm), the solver, the source, the mesh constraint and the monitors.
+    # The rings are etched into the top of the slab unless ring_z (in m) gives their center
+    spec = {}
+    #########################################
+    # SiO2, Si3N4, Air stack
+    #########################################
+    z_min = 0
+    for name, layer in (("SUB", SUB), ("BOX", BOX), ("WG", WG)):
+        spec[name] = {"type": "rect",
+                      "properties": {"x": 0,
+                                     "x span": layer["length"] * 1e-6,
+                                     "y": 0,
+                                     "y span": layer["width"] * 1e-6,
+                                     "z min": z_min * 1e-6,
+                                     "z max": (z_min + layer["height"]) * 1e-6,
+                                     "material": layer["matname"],
+                                     # default settings
+                                     "color opacity": 0.5,
+                                     "override mesh order from material database": 1,
+                                     "mesh order": 3}}
+        z_min += layer["height"]
+
+    #########################################
+    # Add rings
+    #########################################
+    if ring_z is None:
+        ring_z = (SUB["height"] + BOX["height"] + WG["height"] - 0.5 * RING["height"]) * 1e-6
+    spec["RINGS"] = {"type": "rings",
+                     "points": points,
+                     "ring": RING,
+                     "z": ring_z}
+
+    #########################################
+    # Add solver
+    #########################################
+    # boundary conditions are PMC by default
+    spec["FDTD"] = {"type": "fdtd",
+                    "properties": {"simulation time": 200e-15,  # in seconds
+                                   "dimension": "3D",
+                                   "x": 0,
+                                   "y": 0.0,
+                                   "z min": 0.0,
+                                   "x span": BLOCK_LENGTH * 1e-6,
+                                   "y span": BLOCK_WIDTH * 1e-6,
+                                   "z max": SIMULATION_HEIGHT * 1e-6,
+                                   "mesh accuracy": 1,
+                                   "min mesh step": MIN_MESH_STEP * 1e-6}}
+
+    #########################################
+    # Add sources
+    #########################################
+    spec["source"] = {"type": "gaussian",
+                      "properties": {"x": 0,
+                                     "x span": BLOCK_LENGTH * 1e-6,
+                                     "y": 0,
+                                     "y span": BLOCK_WIDTH * 1e-6,
+                                     "z": 20 * 1e-6,
+                                     "waist radius w0": 50 * 1e-6,
+                                     "direction": "Backward",
+                                     "wavelength start": WAVELENGTH_START * 1e-6,
+                                     "wavelength stop": WAVELENGTH_STOP * 1e-6,
+                                     "injection axis": "z",
+                                     "angle theta": injection_angle}}
+
+    #########################################
+    # Add mesh constraint
+    #########################################
+    spec["WG mesh"] = {"type": "mesh",
+                       "properties": {"dx": WG_MESH_STEP * 1e-6,
+                                      "dy": WG_MESH_STEP * 1e-6,
+                                      "dz": WG_MESH_STEP * 1e-6,
+                                      "based on a structure": 1,
+                                      "structure": "WG",
+                                      "buffer": 0.01e-6}}
+
+    #########################################
+    # Add monitors
+    #########################################
+    # 2D y-normal monitor
+    spec["Monitors::2D Y-normal"] = {"type": "power",
+                                     "properties": {"monitor type": 6,  # 2D y normal
+                                                    "y": 0.0,
+                                                    "z min": 0.0,
+                                                    "x span": BLOCK_LENGTH * 1e-6,
+                                                    "z max": 20 * 1e-6}}
+    # 2D x-normal monitor
+    spec["Monitors::2D X-normal"] = {"type": "power",
+                                     "properties": {"monitor type": 5,  # 2D x normal
+                                                    "x": 0.0,
+                                                    "z min": 0.0,
+                                                    "y span": BLOCK_WIDTH * 1e-6,
+                                                    "z max": 20 * 1e-6}}
+
+    # slab-edge monitor(s)
+    # four individual monitors, 2D y normal at -y and +y, 2D x normal at -x and +x
+    slab_edges = [{"monitor type": 6, "y": -0.5 * BLOCK_WIDTH * 1e-6, "x": 0, "x span": BLOCK_LENGTH * 1e-6},
+                  {"monitor type": 6, "y": +0.5 * BLOCK_WIDTH * 1e-6, "x": 0, "x span": BLOCK_LENGTH * 1e-6},
+                  {"monitor type": 5, "x": -0.5 * BLOCK_LENGTH * 1e-6, "y": 0, "y span": BLOCK_WIDTH * 1e-6},
+                  {"monitor type": 5, "x": +0.5 * BLOCK_LENGTH * 1e-6, "y": 0, "y span": BLOCK_WIDTH * 1e-6}]
+    for i, edge in enumerate(slab_edges):
+        spec[f"Monitors::WG edge monitor(s)::{i + 1}"] = {"type": "power", "properties": {**edge, **WG_Z}}
+
+    # substrate monitor
+    spec["Monitors::2D z-normal SUB monitor"] = {"type": "power",
+                                                 "properties": {"monitor type": 7,  # 2D z normal
+                                                                "x": 0.0,
+                                                                "y": 0.0,
+                                                                "x span": BLOCK_LENGTH * 1e-6,
+                                                                "y span": BLOCK_WIDTH * 1e-6,
+                                                                "z": 0.0}}
+    # air monitor
+    spec["Monitors::2D z-normal Air monitor"] = {"type": "power",
+                                                 "properties": {"monitor type": 7,  # 2D z normal
+                                                                "x": 0.0,
+                                                                "y": 0.0,
+                                                                "x span": BLOCK_LENGTH * 1e-6,
+                                                                "y span": BLOCK_WIDTH * 1e-6,
+                                                                "z": 20 * 1e-6}}
+    # movie monitor
+    spec["Monitors::2D x-normal movie monitor"] = {"type": "movie",
+                                                   "properties": {"monitor type": 1,  # 2D x normal
+                                                                  "x": 0,
+                                                                  "y": 0,
+                                                                  "y span": BLOCK_WIDTH * 1e-6,
+                                                                  "z": 0,
+                                                                  "z span": 20 * 1e-6}}
+    # movie monitor 2D z normal in WG, default settings
+    spec["Monitors::2D z-normal WG movie monitor"] = {"type": "movie", "properties": {}}
+    return spec
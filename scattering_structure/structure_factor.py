@@ -0,0 +1,75 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# memory ceiling for the complex exponentials of one chunk of points in bytes
+DEFAULT_MAX_MEMORY = 256 * 2 ** 20
+
+
+def _chunks(n, size):
+    return [slice(i, min(i + size, n)) for i in range(0, n, size)]
+
+
+def density_fourier(points, kx, ky, max_memory=DEFAULT_MAX_MEMORY, n_threads=1, dtype=np.complex128):
+    # rho(k) = sum_j exp(-i k . r_j) on the (ky x kx) grid. The exponential factorizes into
+    # exp(-i kx x_j) exp(-i ky y_j), so every chunk of points is one complex matrix product
+    # (ky x chunk) @ (chunk x kx) that accumulates into rho, the (ky x kx x N) array is never built.
+    # dtype=np.complex64 halves the memory and doubles the speed at reduced precision.
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    kx = np.asarray(kx, dtype=float)
+    ky = np.asarray(ky, dtype=float)
+    itemsize = np.dtype(dtype).itemsize
+    chunk = max(1, int(max_memory // (itemsize * (len(kx) + len(ky)) * max(n_threads, 1))))
+
+    def accumulate(rows):
+        ex = np.exp(-1j * np.outer(p[rows, 0], kx)).astype(dtype, copy=False)  # (chunk, kx)
+        ey = np.exp(-1j * np.outer(ky, p[rows, 1])).astype(dtype, copy=False)  # (ky, chunk)
+        return ey @ ex
+
+    chunks = _chunks(len(p), chunk)
+    rho = np.zeros((len(ky), len(kx)), dtype=dtype)
+    if n_threads > 1 and len(chunks) > 1:
+        # every thread works on its own chunks and partial sum, the matrix products release the GIL
+        groups = [chunks[i::n_threads] for i in range(n_threads)]
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            for partial in executor.map(lambda group: sum(accumulate(rows) for rows in group), groups):
+                rho += partial
+    else:
+        for rows in chunks:
+            rho += accumulate(rows)
+    return rho
+
+
+def density_fourier_vectors(points, k, max_memory=DEFAULT_MAX_MEMORY, dtype=np.complex128):
+    # rho(k) = sum_j exp(-i k . r_j) for an arbitrary set of wave vectors k of shape (M, 2)
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    k = np.asarray(k, dtype=float).reshape(-1, 2)
+    chunk = max(1, int(max_memory // (np.dtype(dtype).itemsize * max(len(k), 1))))
+    rho = np.zeros(len(k), dtype=dtype)
+    for rows in _chunks(len(p), chunk):
+        rho += np.exp(-1j * (p[rows] @ k.T)).astype(dtype, copy=False).sum(axis=0)
+    return rho
+
+
+def structure_factor(points, kx, ky, **kwargs):
+    # S(k) = |rho(k)|^2 / N with shape (len(ky), len(kx)), ready for plt.pcolormesh(kx, ky, S)
+    n = len(points)
+    if n == 0:
+        return np.zeros((len(ky), len(kx)))
+    rho = density_fourier(points, kx, ky, **kwargs)
+    return (rho.real ** 2 + rho.imag ** 2) / n
+
+
+def radial_average(kx, ky, s, bins=100):
+    # azimuthal average S(|k|) of a structure factor on the (ky x kx) grid. Returns the bin centers and
+    # the mean of S in every bin (nan for empty bins)
+    k = np.hypot(*np.meshgrid(kx, ky))
+    if np.isscalar(bins):
+        bins = np.linspace(0, k.max(), int(bins) + 1)
+    bins = np.asarray(bins, dtype=float)
+    index = np.digitize(k.ravel(), bins) - 1
+    valid = (index >= 0) & (index < len(bins) - 1)
+    total = np.bincount(index[valid], weights=np.ravel(s)[valid], minlength=len(bins) - 1)
+    count = np.bincount(index[valid], minlength=len(bins) - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return 0.5 * (bins[1:] + bins[:-1]), mean
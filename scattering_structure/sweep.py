@@ -0,0 +1,68 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .distribution_io import write_manifest
+from .scattering_structure import ScatteringStructure
+
+
+def grid(base: dict, **axes):
+    # all variants of a geometry or arrangement dict, e.g. grid(arrangement, target_mom=[0.02, 0.04, 0.06])
+    keys = list(axes)
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*(axes[k] for k in keys))]
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _build(job):
+    # runs in a worker process: build one structure and write it to disk right away
+    index, geometry, arrangement, scatterer_radius, filepath = job
+    structure = ScatteringStructure(geometry=geometry, arrangement=arrangement, scatterer_radius=scatterer_radius)
+    structure.save_device(filepath)
+    return {'index': index,
+            'filepath': filepath,
+            'geometry': geometry,
+            'arrangement': arrangement,
+            'scatterer_radius': scatterer_radius,
+            'num_points': len(structure.reduced_points),
+            'density': structure.density()}
+
+
+def build_sweep(geometries, arrangements, scatterer_radii, directory, name='device', extension='.npy',
+                n_workers=None, seed=None):
+    # builds every combination of geometry, arrangement and scatterer radius in a process pool and saves each
+    # distribution as soon as it is finished. Arrangements without their own 'seed' get an independent one
+    # spawned from seed, so the whole sweep is reproducible. Yields one result dict per finished device
+    # (in completion order) and updates the sweep.json manifest of the finished devices after each one.
+    # build_sweep is a generator, nothing is built until it is iterated (e.g. list(build_sweep(...))) and a
+    # sweep that is stopped early leaves the devices and the manifest up to that point
+    os.makedirs(directory, exist_ok=True)
+    combinations = list(itertools.product(_as_list(geometries), _as_list(arrangements), _as_list(scatterer_radii)))
+    children = np.random.SeedSequence(seed).spawn(len(combinations))
+
+    jobs = []
+    for index, ((geometry, arrangement, scatterer_radius), child) in enumerate(zip(combinations, children)):
+        if arrangement.get('seed') is None:
+            arrangement = {**arrangement, 'seed': int(child.generate_state(1)[0])}
+        filepath = os.path.join(directory, f'{name}_{index:04d}{extension}')
+        jobs.append((index, geometry, arrangement, scatterer_radius, filepath))
+
+    manifest = os.path.join(directory, 'sweep.json')
+    results = []
+    write_manifest(manifest, results)
+    if n_workers == 1:
+        for job in jobs:
+            results.append(_build(job))
+            write_manifest(manifest, results)
+            yield results[-1]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_build, job) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+                write_manifest(manifest, results)
+                yield results[-1]
@@ -0,0 +1,147 @@
+from collections import deque
+
+import numpy as np
+
+from .cell_list import pairs_within
+from .structure_factor import DEFAULT_MAX_MEMORY
+
+# Stealthy patterns: the points in a periodic (lx x ly) box are moved until the structure factor vanishes
+# for all wave vectors of the box with k_min < |k| <= k_max. The objective is
+#   sum_k S(k) = sum_k |rho(k)|^2 / N,  rho(k) = sum_j exp(-i k . r_j) = C(k) - i S_(k)
+# with the gradient 2 / N sum_k k (S_(k) cos(k . r_j) - C(k) sin(k . r_j)) for point j, plus a penalty
+# for every pair closer than the exclusion distance.
+
+
+def reciprocal_vectors(lx, ly, k_max, k_min=0):
+    # wave vectors 2 pi (n / lx, m / ly) with k_min < |k| <= k_max. rho(-k) is the complex conjugate
+    # of rho(k), so only one of every pair +-k is kept
+    n = np.arange(-int(k_max * lx / (2 * np.pi)), int(k_max * lx / (2 * np.pi)) + 1)
+    m = np.arange(0, int(k_max * ly / (2 * np.pi)) + 1)
+    n, m = np.meshgrid(n, m)
+    k = np.column_stack([2 * np.pi * n.ravel() / lx, 2 * np.pi * m.ravel() / ly])
+    half = (m.ravel() > 0) | (n.ravel() > 0)
+    length = np.hypot(k[:, 0], k[:, 1])
+    return k[half & (length > k_min) & (length <= k_max)]
+
+
+def collective_objective(points, k, max_memory=DEFAULT_MAX_MEMORY):
+    # sum_k S(k) and its gradient with respect to the (N, 2) points, evaluated in chunks of wave vectors
+    n = len(points)
+    chunk = max(1, int(max_memory // (3 * 8 * max(n, 1))))
+    value = 0.0
+    gradient = np.zeros_like(points)
+    for start in range(0, len(k), chunk):
+        kc = k[start:start + chunk]
+        phase = points @ kc.T
+        cos, sin = np.cos(phase), np.sin(phase)
+        c, s = cos.sum(axis=0), sin.sum(axis=0)
+        value += np.sum(c * c + s * s)
+        gradient += 2 * ((cos * s - sin * c) @ kc)
+    return value / n, gradient / n
+
+
+def overlap_penalty(points, distance, box):
+    # sum over all pairs closer than distance of (1 - d / distance)^2 in the periodic box, and its gradient
+    lx, ly = box
+    points = np.mod(points, (lx, ly))
+    n = len(points)
+    # ghost copies of the points near the edges stand in for the periodic images
+    images, owners = [points], [np.arange(n)]
+    for sx in (-1, 0, 1):
+        for sy in (-1, 0, 1):
+            if sx == 0 and sy == 0:
+                continue
+            shifted = points + (sx * lx, sy * ly)
+            near = ((shifted[:, 0] > -distance) & (shifted[:, 0] < lx + distance)
+                    & (shifted[:, 1] > -distance) & (shifted[:, 1] < ly + distance))
+            images.append(shifted[near])
+            owners.append(np.flatnonzero(near))
+    images, owners = np.concatenate(images), np.concatenate(owners)
+
+    i, j = pairs_within(images, distance)
+    # pairs of two ghosts repeat pairs of the originals, pairs across the edge are found twice
+    keep = i < n
+    i, j = i[keep], j[keep]
+    weight = np.where(j < n, 1.0, 0.5)
+    delta = images[i] - images[j]
+    d = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-12 * distance)
+    overlap = 1 - d / distance
+    value = np.sum(weight * overlap ** 2)
+    # d/dr_i (1 - d / distance)^2 = -2 (1 - d / distance) (r_i - r_j) / (d distance)
+    force = (-2 * weight * overlap / (d * distance))[:, None] * delta
+    gradient = np.zeros_like(points)
+    np.add.at(gradient, i, force)
+    np.add.at(gradient, owners[j], -force)
+    return value, gradient
+
+
+def lbfgs(fun, x0, max_iterations=1000, memory=10, tolerance=1e-8, initial_step=None):
+    # limited-memory BFGS with a backtracking Armijo line search. fun(x) returns (value, gradient),
+    # initial_step limits the largest component of the first step
+    x = np.array(x0, dtype=float)
+    f, g = fun(x)
+    history = deque(maxlen=memory)
+    for _ in range(max_iterations):
+        # two-loop recursion for the quasi-Newton direction
+        q = g.ravel().copy()
+        alphas = []
+        for s, y, rho in reversed(history):
+            alpha = rho * (s @ q)
+            q -= alpha * y
+            alphas.append(alpha)
+        if history:
+            s, y, _ = history[-1]
+            q *= (s @ y) / (y @ y)
+        elif initial_step is not None:
+            q *= initial_step / max(np.abs(q).max(), 1e-300)
+        for (s, y, rho), alpha in zip(history, reversed(alphas)):
+            q += s * (alpha - rho * (y @ q))
+        direction = -q.reshape(x.shape)
+
+        slope = np.sum(g * direction)
+        if slope >= 0:
+            # not a descent direction, restart from steepest descent
+            history.clear()
+            direction = -g * (initial_step / max(np.abs(g).max(), 1e-300) if initial_step else 1)
+            slope = np.sum(g * direction)
+
+        step = 1.0
+        for _ in range(40):
+            x_new = x + step * direction
+            f_new, g_new = fun(x_new)
+            if f_new <= f + 1e-4 * step * slope:
+                break
+            step *= 0.5
+        else:
+            break
+
+        s, y = (x_new - x).ravel(), (g_new - g).ravel()
+        if s @ y > 1e-12:
+            history.append((s, y, 1 / (s @ y)))
+        converged = f - f_new <= tolerance * max(abs(f), 1)
+        x, f, g = x_new, f_new, g_new
+        if converged:
+            break
+    return x, f
+
+
+def optimize_structure_factor(points, box, k, exclusion_distance, overlap_weight=None, max_iterations=1000,
+                              max_memory=DEFAULT_MAX_MEMORY):
+    # moves the points until sum_k S(k) is minimal and no pair is closer than exclusion_distance.
+    # The overlap penalty is raised tenfold as long as pairs overlap after a run
+    points = np.mod(np.asarray(points, dtype=float).reshape(-1, 2), box)
+    weight = len(k) if overlap_weight is None else overlap_weight
+
+    for _ in range(6):
+        def fun(x):
+            value, gradient = collective_objective(x, k, max_memory)
+            penalty, penalty_gradient = overlap_penalty(x, exclusion_distance, box)
+            return value + weight * penalty, gradient + weight * penalty_gradient
+
+        points, _ = lbfgs(fun, points, max_iterations=max_iterations, initial_step=0.1 * exclusion_distance)
+        points = np.mod(points, box)
+        # a slightly smaller distance accepts the rounding of the converged penalty
+        if overlap_penalty(points, (1 - 1e-6) * exclusion_distance, box)[0] == 0:
+            break
+        weight *= 10
+    return points
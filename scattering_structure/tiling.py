@@ -0,0 +1,190 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .bridson import bridson
+from .cache import jsonable
+from .random_sequential_addition import RandomSequentialAddition
+
+# Wafer-scale patterns are generated tile by tile. The tiles are processed in four phases of a 2 x 2
+# checkerboard, tiles of the same phase are at least one tile apart and therefore independent as long as
+# the tile size is not below the exclusion distance. Every tile sees the points of its already finished
+# neighbours within one exclusion distance of its edges as fixed points, so the exclusion holds across
+# the seams. Each tile is written to its own .npy file right away, a worker never holds more than one
+# tile and the halo of its neighbours in memory.
+
+
+class TileStore:
+    # on-disk store of a tiled pattern, one .npy file per tile plus a tiles.json manifest
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, tile):
+        return os.path.join(self.directory, f'tile_{tile[0]:05d}_{tile[1]:05d}.npy')
+
+    def write(self, tile, points):
+        # temporary file first, so readers never see a partially written tile
+        path = self._path(tile)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            np.save(file, np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2))
+        os.replace(temporary, path)
+
+    def read(self, tile, mmap=True):
+        # points of the tile, None if it was not generated (yet)
+        path = self._path(tile)
+        if not os.path.isfile(path):
+            return None
+        return np.load(path, mmap_mode='r' if mmap else None)
+
+    def tiles(self):
+        # the tiles of the run in the manifest, all tiles on disk while it is not written yet
+        manifest = os.path.join(self.directory, 'tiles.json')
+        if os.path.isfile(manifest):
+            with open(manifest) as file:
+                return sorted(tuple(entry['tile']) for entry in json.load(file)['tiles'])
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith('tile_')
+                       and name.endswith('.npy'))
+        return [tuple(int(part) for part in name[5:-4].split('_')) for name in names]
+
+    def clear(self):
+        # removes the tiles and the manifest of an earlier run, they would be read as halo otherwise
+        for name in os.listdir(self.directory):
+            if name == 'tiles.json' or name.startswith('tile_') and name.endswith(('.npy', '.tmp')):
+                os.remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return sum(len(self.read(tile)) for tile in self.tiles())
+
+    def __iter__(self):
+        # the points tile by tile
+        for tile in self.tiles():
+            yield self.read(tile)
+
+    def write_manifest(self, manifest):
+        with open(os.path.join(self.directory, 'tiles.json'), 'w') as file:
+            json.dump(manifest, file, default=jsonable, indent=2)
+
+    def consolidate(self, filepath):
+        # copies all tiles into one (N, 2) .npy file without loading more than one tile at a time
+        out = np.lib.format.open_memmap(filepath, mode='w+', dtype=np.float64, shape=(len(self), 2))
+        start = 0
+        for points in self:
+            out[start:start + len(points)] = points
+            start += len(points)
+        out.flush()
+        del out
+        return filepath
+
+
+def tile_grid(lx, ly, tile_size):
+    # (i, j) -> (min_x, max_x, min_y, max_y) of all tiles that cover the (lx x ly) box
+    nx, ny = int(np.ceil(lx / tile_size)), int(np.ceil(ly / tile_size))
+    xs = np.minimum(np.arange(nx + 1) * tile_size, lx)
+    ys = np.minimum(np.arange(ny + 1) * tile_size, ly)
+    return {(i, j): (xs[i], xs[i + 1], ys[j], ys[j + 1]) for j in range(ny) for i in range(nx)}
+
+
+def _halo(store, tile, bounds, distance):
+    # points of the finished neighbours that lie within distance of the tile
+    min_x, max_x, min_y, max_y = bounds
+    halo = []
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if di == 0 and dj == 0:
+                continue
+            points = store.read((tile[0] + di, tile[1] + dj))
+            if points is None or len(points) == 0:
+                continue
+            near = ((points[:, 0] > min_x - distance) & (points[:, 0] < max_x + distance)
+                    & (points[:, 1] > min_y - distance) & (points[:, 1] < max_y + distance))
+            halo.append(np.asarray(points[near]))
+    return np.concatenate(halo) if halo else np.empty((0, 2))
+
+
+def _sample_tile(job):
+    # runs in a worker process: samples one tile around the halo of its neighbours and writes it
+    directory, tile, bounds, sampling, seed = job
+    store = TileStore(directory)
+    rng = np.random.default_rng(seed)
+    min_x, max_x, min_y, max_y = bounds
+    distance = sampling['distance']
+    halo = _halo(store, tile, bounds, distance)
+
+    if sampling['type'] == 'random':
+        # the outer edges of the box keep the margin of the untiled pattern
+        margin = sampling['margin']
+        lx, ly = sampling['box']
+        rsa = RandomSequentialAddition(bounds=(max(min_x, margin), min(max_x, lx - margin),
+                                               max(min_y, margin), min(max_y, ly - margin)),
+                                       exclusion_distance=distance, rng=rng)
+        rsa.add_points(halo)
+        points = rsa.fill(num_points=sampling['num_points'][tile])
+    else:
+        # Bridson in tile coordinates, grown from the halo
+        domain = {'type': 'box', 'lx': max_x - min_x, 'ly': max_y - min_y}
+        points = bridson(distance, domain, rng=rng, fixed=halo - (min_x, min_y)) + (min_x, min_y)
+
+    store.write(tile, points)
+    return tile, len(points)
+
+
+def _points_per_tile(num_points, tiles, area):
+    # splits num_points over the tiles in proportion to their area, the remainder goes to the largest rests
+    share = np.array([num_points * (b[1] - b[0]) * (b[3] - b[2]) / area for b in tiles.values()])
+    counts = np.floor(share).astype(int)
+    counts[np.argsort(counts - share)[:num_points - counts.sum()]] += 1
+    return dict(zip(tiles, counts.tolist()))
+
+
+def generate_tiled(geometry, arrangement, scatterer_radius, directory, n_workers=None, seed=None):
+    # generates a 'random' or 'poisson_disc' pattern in the (lx x ly) box of the geometry tile by tile
+    # with arrangement['tile_size'] and returns the TileStore with the tiles. Tiles of an earlier run in the
+    # directory are removed first
+    lx, ly = geometry['lx'], geometry['ly']
+    tile_size = arrangement['tile_size']
+    if arrangement.get('optimization'):
+        raise ValueError('Tiled generation does not support the optimization of a measure of merit')
+    if arrangement['type'] == 'random':
+        distance = 4 * scatterer_radius
+    elif arrangement['type'] == 'poisson_disc':
+        distance = arrangement['poisson_radius']
+    else:
+        raise TypeError(f'The arrangement type {arrangement["type"]} cannot be generated in tiles')
+    if tile_size < distance:
+        raise ValueError(f'The tile size {tile_size} is smaller than the exclusion distance {distance}')
+
+    tiles = tile_grid(lx, ly, tile_size)
+    sampling = {'type': arrangement['type'], 'distance': distance, 'margin': scatterer_radius, 'box': (lx, ly)}
+    if arrangement['type'] == 'random':
+        sampling['num_points'] = _points_per_tile(arrangement['num_points'], tiles, lx * ly)
+
+    # one independent stream per tile, so the pattern does not depend on the number of workers
+    store = TileStore(directory)
+    store.clear()
+    children = np.random.SeedSequence(seed).spawn(len(tiles))
+    seeds = {tile: child for tile, child in zip(tiles, children)}
+    phases = [[tile for tile in tiles if (tile[0] % 2, tile[1] % 2) == phase]
+              for phase in ((0, 0), (1, 0), (0, 1), (1, 1))]
+
+    counts = {}
+    if n_workers == 1:
+        for phase in phases:
+            for tile in phase:
+                counts.update([_sample_tile((directory, tile, tiles[tile], sampling, seeds[tile]))])
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for phase in phases:
+                # every phase waits for the previous one, its tiles need the finished neighbours
+                jobs = [(directory, tile, tiles[tile], sampling, seeds[tile]) for tile in phase]
+                counts.update(executor.map(_sample_tile, jobs))
+
+    store.write_manifest({'geometry': geometry,
+                          'arrangement': arrangement,
+                          'scatterer_radius': scatterer_radius,
+                          'tiles': [{'tile': tile, 'bounds': tiles[tile], 'num_points': counts[tile]}
+                                    for tile in tiles]})
+    return store
@@ -0,0 +1,56 @@
+import numpy as np
+
+from .cell_list import iter_pairs
+from .geometry import shape_mask
+
+# points closer than this are reported as duplicates
+DUPLICATE_TOLERANCE = 1e-9
+
+
+class ValidationReport:
+    # result of validate_points: every pair closer than the spacing (indices and distance), the duplicates
+    # among them and the indices of the points outside the geometry
+    def __init__(self, num_points, spacing, close_pairs, duplicates, outside):
+        self.num_points = num_points
+        self.spacing = spacing
+        self.close_pairs = close_pairs
+        self.duplicates = duplicates
+        self.outside = outside
+
+    @property
+    def valid(self):
+        return len(self.close_pairs[0]) == 0 and len(self.outside) == 0
+
+    def __str__(self):
+        lines = [f'{self.num_points} points, minimum spacing {self.spacing}:',
+                 f'  {len(self.close_pairs[0])} pairs closer than the spacing',
+                 f'  {len(self.duplicates[0])} duplicates',
+                 f'  {len(self.outside)} points outside the geometry']
+        i, j, d = self.close_pairs
+        for k in np.argsort(d)[:10]:
+            lines.append(f'  points {i[k]} and {j[k]} are {d[k]:.6g} apart')
+        return '\n'.join(lines)
+
+
+def validate_points(points, spacing, geometry=None, duplicate_tolerance=DUPLICATE_TOLERANCE):
+    # checks the points in one cell-list pass. The geometry is optional, the points are relative to
+    # its center (like the reduced points of a ScatteringStructure)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    first, second, distance = [], [], []
+    for i, j, d in iter_pairs(points, max(spacing, duplicate_tolerance)):
+        first.append(i)
+        second.append(j)
+        distance.append(d)
+    if first:
+        i, j, d = np.concatenate(first), np.concatenate(second), np.concatenate(distance)
+    else:
+        i, j, d = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    duplicate = d <= duplicate_tolerance
+    close = d < spacing
+
+    outside = np.empty(0, dtype=np.int64)
+    if geometry is not None:
+        outside = np.flatnonzero(~shape_mask(geometry, points[:, 0], points[:, 1]))
+    return ValidationReport(len(points), spacing, (i[close | duplicate], j[close | duplicate],
+                                                   d[close | duplicate]),
+                            (i[duplicate], j[duplicate]), outside)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from scattering_structure.analysis import (coordination_numbers, nearest_neighbour_histogram, number_variance,
+                                           radial_distribution)
+from scattering_structure.scattering_structure import ScatteringStructure
+
+GEOMETRIES = [{'type': 'box', 'lx': 40, 'ly': 40},
+              {'type': 'circle', 'lx': 40, 'ly': 40, 'circle_radius': 20}]
+
+
+def analyse(structure):
+    return [radial_distribution(structure, r_max=5, bins=20)[1],
+            nearest_neighbour_histogram(structure, bins=20)[1],
+            number_variance(structure, radii=[2, 4], n_windows=50, rng=np.random.default_rng(0)),
+            coordination_numbers(structure, cutoff=2)]
+
+
+def loaded(filepath):
+    return ScatteringStructure(geometry={'type': 'load_from_file'},
+                               arrangement={'type': 'load_from_file', 'filepath': str(filepath)},
+                               scatterer_radius=0.3)
+
+
+@pytest.mark.parametrize('geometry', GEOMETRIES, ids=lambda geometry: geometry['type'])
+@pytest.mark.parametrize('extension', ['.npy', '.npz'])
+def test_loaded_device_has_the_window_of_the_saved_one(tmp_path, geometry, extension):
+    structure = ScatteringStructure(geometry=geometry,
+                                    arrangement={'type': 'random', 'optimization': False, 'num_points': 300,
+                                                 'seed': 1},
+                                    scatterer_radius=0.3)
+    filepath = tmp_path / f'device{extension}'
+    structure.save_device(str(filepath))
+    # boxes and circles keep all points the analysis uses in the device file
+    for expected, result in zip(analyse(structure), analyse(loaded(filepath))):
+        np.testing.assert_allclose(result, expected)
+
+
+def test_loaded_text_file_uses_the_bounding_box(tmp_path):
+    structure = ScatteringStructure(geometry=GEOMETRIES[0],
+                                    arrangement={'type': 'random', 'optimization': False, 'num_points': 300,
+                                                 'seed': 1},
+                                    scatterer_radius=0.3)
+    filepath = tmp_path / 'device.txt'
+    structure.save_device(str(filepath))
+    for result in analyse(loaded(filepath)):
+        assert len(result)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from scattering_structure.point_set import PointSet
+
+
+def make_points():
+    xy = np.arange(20, dtype=float).reshape(10, 2)
+    return xy, PointSet(xy, radius=np.arange(10))
+
+
+def test_column_indexing_gives_arrays():
+    xy, points = make_points()
+    column = points[:, 0]
+    assert isinstance(column, np.ndarray)
+    np.testing.assert_array_equal(column, xy[:, 0])
+    assert points[3, 1] == xy[3, 1]
+
+
+def test_row_selections_give_point_sets():
+    xy, points = make_points()
+    mask = xy[:, 0] > 9
+    selected = points[mask]
+    assert isinstance(selected, PointSet)
+    np.testing.assert_array_equal(selected.xy, xy[mask])
+    np.testing.assert_array_equal(selected['radius'], np.arange(10)[mask])
+
+    sliced = points[2:5]
+    assert isinstance(sliced, PointSet)
+    np.testing.assert_array_equal(sliced.xy, xy[2:5])
+    np.testing.assert_array_equal(sliced['radius'], [2, 3, 4])
+
+
+def test_single_point_is_a_row():
+    xy, points = make_points()
+    np.testing.assert_array_equal(points[4], xy[4])